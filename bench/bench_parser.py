@@ -0,0 +1,44 @@
+"""Разбор листа целиком: одна нормализация и классификация на ячейку (Grid) против норм/регулярок на каждое обращение.
+
+Широкий лист — несколько полос-шапок по 10 классов; результат обязан совпасть с прежним.
+
+    python bench/bench_parser.py
+"""
+import csv
+from io import StringIO
+
+from common import timeit
+
+import fixtures
+import legacy
+from pokrovsky_bot import parser
+
+
+def schedule_all(rows):
+    grid = parser.Grid(rows)
+    labels, headers = parser.parse_headers(grid)
+    cab_map = parser.build_cab_map(grid, labels, headers)
+    return {lb: parser.collapse_by_time(parser.extract_schedule(grid, labels, headers, lb, cab_map[lb]))
+            for lb in labels}
+
+
+def main():
+    cases = [
+        ("small", {}),
+        ("wide", {"grades": (5, 6, 7, 8, 9), "classes": 10}),
+        ("wide_bare", {"grades": (5, 6, 7, 8, 9), "classes": 10, "cab_header": False}),
+    ]
+    for name, kw in cases:
+        # через CSV, чтобы строки не были общими объектами генератора
+        rows = list(csv.reader(StringIO(fixtures.sheet_csv(**kw), newline="")))
+        assert schedule_all(rows) == legacy.schedule_all(rows), f"{name}: результаты расходятся"
+        cells = sum(len(r) for r in rows)
+        t_old = min(timeit(lambda: legacy.schedule_all(rows), 5))
+        t_new = min(timeit(lambda: schedule_all(rows), 5))
+        t_grid = min(timeit(lambda: parser.Grid(rows), 5))
+        print(f"{name:>10} ячеек={cells:<6} legacy={t_old * 1000:7.1f} мс  grid={t_new * 1000:6.1f} мс "
+              f"(из них Grid {t_grid * 1000:5.1f} мс)  x{t_old / t_new:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+"""Метаданные вкладок из htmlview: однопроходный токенайзер против BeautifulSoup + ленивых регулярок.
+
+Размер страницы растёт с scale; у линейного разбора время на КБ должно оставаться постоянным.
+
+    python bench/bench_sheets_meta.py
+"""
+from common import timeit, BENCH
+
+import fixtures
+import legacy
+from pokrovsky_bot.sheets import parse_sheets_meta
+
+
+def main():
+    saved = (BENCH / "fixtures" / "htmlview.html").read_text(encoding="utf-8")
+    cases = [("saved", saved)] + [(f"x{k}", fixtures.htmlview(k)) for k in (2, 4, 8)]
+    for name, html_text in cases:
+        new, old = parse_sheets_meta(html_text), legacy.parse_sheets_meta(html_text)
+        assert new == old, f"{name}: результаты расходятся"
+        kb = len(html_text) / 1024
+        t_old = min(timeit(lambda: legacy.parse_sheets_meta(html_text), 3))
+        t_new = min(timeit(lambda: parse_sheets_meta(html_text), 3))
+        print(f"{name:>6} {kb:7.0f} КБ  вкладок={len(new[0]):<3} "
+              f"legacy={t_old * 1000:8.1f} мс ({t_old * 1e6 / kb:6.1f} мкс/КБ)  "
+              f"new={t_new * 1000:7.1f} мс ({t_new * 1e6 / kb:5.1f} мкс/КБ)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+"""Разбор страницы школы: однопроходный экстрактор против старого BeautifulSoup-обхода.
+
+    python bench/bench_site.py
+"""
+from common import timeit, BENCH
+
+import fixtures
+import legacy
+from pokrovsky_bot.site import parse_links
+
+PAGE_URL = "https://pokrovsky.gosuslugi.ru/glavnoe/raspisanie/"
+
+
+def main():
+    saved = (BENCH / "fixtures" / "school_page.html").read_text(encoding="utf-8")
+    cases = [("saved", saved)] + [(f"x{k}", fixtures.school_page(k)) for k in (2, 4)]
+    for name, html_text in cases:
+        new, old = parse_links(html_text, PAGE_URL), legacy.parse_links(html_text, PAGE_URL)
+        assert new == old, f"{name}: результаты расходятся"
+        t_old = min(timeit(lambda: legacy.parse_links(html_text, PAGE_URL), 3))
+        t_new = min(timeit(lambda: parse_links(html_text, PAGE_URL), 3))
+        print(f"{name:>6} {len(html_text) // 1024:>5} КБ  ссылок={len(new):<4} "
+              f"legacy={t_old * 1000:8.1f} мс  new={t_new * 1000:7.1f} мс  x{t_old / t_new:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""xlsx-выгрузка всей таблицы против CSV по вкладкам: строки обязаны совпасть с CSV (и хэш листа тоже).
+
+В CSV Google отдаёт то, что показывает таблица, поэтому числа в xlsx форматируются по коду формата ячейки
+(даты, время, фиксированные знаки, проценты).
+
+    python bench/bench_xlsx.py
+"""
+import csv
+from io import StringIO
+
+from common import timeit, BENCH
+
+import fixtures
+from pokrovsky_bot.utils import rows_hash
+from pokrovsky_bot.xlsx import SEPARATORS, _number, read_workbook
+
+# значение, формат, как в CSV таблицы с русской локалью, как с английской
+FORMATS = [
+    ("5", "00", "05", "05"),
+    ("7", "000", "007", "007"),
+    ("123", "00", "123", "123"),
+    ("2.5", "0.00", "2,50", "2.50"),
+    ("0.75", "0.00", "0,75", "0.75"),
+    ("1234.5", "#,##0.00", "1\u00a0234,50", "1,234.50"),
+    ("2.5", None, "2,5", "2.5"),
+]
+
+
+def _csv(name: str):
+    return list(csv.reader(StringIO((BENCH / "fixtures" / name).read_text(encoding="utf-8"), newline="")))
+
+
+def main():
+    for v, fmt, ru, en in FORMATS:
+        for locale, want in (("ru", ru), ("en", en)):
+            got = _number(v, fmt, SEPARATORS[locale])
+            assert got == want, f"{v} в формате {fmt!r} ({locale}): {got!r}, в CSV {want!r}"
+    data = (BENCH / "fixtures" / "workbook.xlsx").read_bytes()
+    book = read_workbook(data)
+    for title, name in (("Типы", "workbook.csv"), ("7 классы", "sheet.csv")):
+        rows = _csv(name)
+        assert rows_hash(book[title]) == rows_hash(rows), f"{title}: хэш xlsx и CSV расходится"
+        assert book[title] == rows[:len(book[title])], f"{title}: строки xlsx и CSV расходятся"
+    t_xlsx = min(timeit(lambda: read_workbook(data), 5))
+    text = fixtures.sheet_csv()
+    t_csv = min(timeit(lambda: list(csv.reader(StringIO(text, newline=""))), 5))
+    print(f"read_workbook={t_xlsx * 1000:6.2f} мс на {len(book)} листа  csv.reader={t_csv * 1000:6.2f} мс на лист  "
+          f"(листы совпадают с CSV)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List
+
+BENCH = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH.parent / "src"))
+os.environ.setdefault("BOT_TOKEN", "bench")
+
+
+def timeit(fn: Callable[[], object], repeat: int = 5) -> List[float]:
+    """Время каждого из repeat запусков, сек."""
+    out = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        out.append(time.perf_counter() - t0)
+    return out
+
+
+def percentile(xs: List[float], p: float) -> float:
+    xs = sorted(xs)
+    k = (len(xs) - 1) * p / 100
+    lo, hi = int(k), min(int(k) + 1, len(xs) - 1)
+    return xs[lo] + (xs[hi] - xs[lo]) * (k - lo)
+
+
+def peak_memory(fn: Callable[[], object]) -> int:
+    """Пик выделенной памяти за один запуск, байт (tracemalloc)."""
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def measure(fn: Callable[[], object], repeat: int = 30, warmup: int = 3) -> Dict[str, float]:
+    for _ in range(warmup):
+        fn()
+    ts = timeit(fn, repeat)
+    return {
+        "runs": repeat,
+        "ops_per_sec": repeat / sum(ts),
+        "mean_ms": statistics.fmean(ts) * 1000,
+        "p50_ms": percentile(ts, 50) * 1000,
+        "p95_ms": percentile(ts, 95) * 1000,
+        "p99_ms": percentile(ts, 99) * 1000,
+        "peak_kb": peak_memory(fn) / 1024,
+    }
@@ -0,0 +1,234 @@
+"""Генератор офлайн-фикстур для бенчмарков.
+
+Живые страницы из песочницы недоступны, поэтому фикстуры собраны по структуре
+реальных страниц (сайт школы на конструкторе Госуслуг, htmlview Google Sheets,
+CSV-выгрузка листа) и детерминированы: одинаковый scale даёт одинаковый файл.
+
+    python bench/fixtures.py        # перезаписать файлы в bench/fixtures/
+"""
+import csv
+import io
+import random
+import zipfile
+from datetime import date, timedelta
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+
+
+def _dates(n: int):
+    d = date(2025, 9, 1)
+    out = []
+    while len(out) < n:
+        if d.weekday() < 6:
+            out.append(f"{d:%d.%m}")
+        d += timedelta(days=1)
+    return out
+
+
+def _wrap(html: str, depth: int) -> str:
+    # конструктор сайта заворачивает каждый блок в глубокую матрёшку div-ов
+    for i in range(depth):
+        html = f'<div class="wrap-{i}"><div class="inner">{html}</div></div>'
+    return html
+
+
+def school_page(scale: int = 1) -> str:
+    rnd = random.Random(1)
+    dates = _dates(40 * scale)
+    nav = "".join(f'<li><a href="/glavnoe/razdel-{i}/">Раздел {i}</a></li>' for i in range(60))
+    blocks = []
+    for section in (1, 2, 3):
+        items = []
+        for d in dates:
+            items.append(f'<li><a href="/upload/site/raspisanie-{section}-{d}.html">'
+                         f'Расписание уроков на {d}</a></li>')
+            if rnd.random() < 0.5:
+                items.append(f'<li><a href="/upload/site/nsh-{section}-{d}.html">'
+                             f'Расписание уроков на {d} (начальная школа)</a></li>')
+            if rnd.random() < 0.2:
+                items.append(f'<li><span>Изменения на {d}</span> <a href="/news/{section}-{d}/">подробнее</a></li>')
+        body = (f'<h3><strong>Образовательная площадка&nbsp;№{section}</strong></h3>'
+                f'<p>Адрес: ул. Примерная, д. {section}</p><ul>{"".join(items)}</ul>')
+        blocks.append(_wrap(body, 6))
+    footer = "".join(f"<p>Текст подвала {i}. Лицензия, реквизиты, контакты.</p>" for i in range(40))
+    return (
+        '<!DOCTYPE html><html lang="ru"><head><meta charset="utf-8"><title>Расписание</title>'
+        '<script>window.__cfg = {"menu": "Образовательная площадка №9"};</script>'
+        '<style>.wrap-0{display:block}</style></head><body>'
+        f'<header><nav><ul>{nav}</ul></nav></header><main><h1>Расписание</h1>'
+        f'{"".join(blocks)}</main><footer>{footer}</footer></body></html>'
+    )
+
+
+def htmlview(scale: int = 1) -> str:
+    """Страница htmlview таблицы: вкладки-ссылки, bootstrap-JSON скриптов, сетка первого листа."""
+    rnd = random.Random(2)
+    tabs = [(str(rnd.randrange(10 ** 8, 10 ** 9) if i else 0), f"{g} классы") for i, g in enumerate(range(5, 12))]
+    tabs += [(str(rnd.randrange(10 ** 8, 10 ** 9)), f"Лист{i}") for i in range(3 * scale)]
+    menu = "".join(f'<li id="sheet-button-{gid}"><a href="#gid={gid}">{t}</a></li>' for gid, t in tabs)
+    items = "".join(
+        f'items.push({{name: "{t}", pageUrl: "https:\\/\\/docs.google.com\\/spreadsheets\\/d\\/ID\\/htmlview\\/sheet'
+        f'?headers\\x3dtrue\\x26gid={gid}", gid: "{gid}",initialSheet: {str(not i).lower()}}});'
+        for i, (gid, t) in enumerate(tabs)
+    )
+    snapshot = ",".join(f'{{"sheetId":{gid},"index":{i},"title":"{t}","gridProperties":{{"rowCount":1000}}}}'
+                        for i, (gid, t) in enumerate(tabs))
+    escaped = ",".join(f'{{\\"gid\\":\\"{gid}\\",\\"title\\":\\"{t}\\"}}' for gid, t in tabs)
+    cells = []
+    for r in range(60 * scale):
+        tds = "".join(f'<td class="s{c % 7}" dir="ltr">{rnd.choice(["Алгебра", "каб. 305", "8:30-9:15", ""])}</td>'
+                      for c in range(24))
+        cells.append(f'<tr style="height: 20px"><th id="0R{r}" class="row-headers-background">{r + 1}</th>{tds}</tr>')
+    # защищённые диапазоны и фильтры: gid без title — на них старые регулярки пробегают документ до конца
+    ranges = ",".join(f'{{"gid":{gid},"range":[{i},0,{i + 5},4]}}' for i, (gid, _t) in enumerate(tabs * (4 * scale)))
+    return (
+        "<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>Расписание</title>"
+        f'<script>var items = []; {items}</script>'
+        f'<script>var bootstrapData = {{"topsnapshot":[{snapshot}],"escaped":"[{escaped}]"}};</script></head>'
+        f'<body><div id="top-bar"><ul id="sheet-menu">{menu}</ul></div>'
+        f'<div id="sheets-viewport"><div id="0" style="display:none;position:relative;">'
+        f'<table class="waffle" cellspacing="0" cellpadding="0"><tbody>{"".join(cells)}</tbody></table></div></div>'
+        f'<script>var protectedRanges = [{ranges}];</script></body></html>'
+    )
+
+
+SUBJECTS = [
+    "Алгебра", "Геометрия", "Русский язык", "Литература", "История", "Обществознание", "Физика",
+    "Химия", "Биология", "География", "Английский язык", "Информатика", "Физическая культура", "ОБЗР",
+    "Вероятность и статистика", "Труд (технология)", "Музыка", "ИЗО",
+]
+CABS = ["Б1-12", "Б1-14", "Б2-05", "Б2-07", "А3-21", "каб. 214", "спортзал", "актовый зал", "Б1-12/Б1-14"]
+TIMES = ["8:30-9:15", "9:25-10:10", "10:25-11:10", "11:25-12:10", "12:25-13:10", "13:20-14:05",
+         "14:15-15:00", "15:10-15:55"]
+
+
+def sheet_rows(grades=(7, 8), classes: int = 6, lessons: int = 8, seed: int = 3, cab_header: bool = True):
+    """Лист с полосами классов: шапка «№ | Время | 7А | каб. | 7Б | каб. …», под ней уроки.
+
+    cab_header=False — колонки кабинетов без подписи, их приходится угадывать по содержимому.
+    """
+    rnd = random.Random(seed)
+    letters = "АБВГДЕЖИКЛМН"[:classes]
+    width = 2 + 2 * classes
+    rows = [["Расписание уроков на 08.09"] + [""] * (width - 1), [""] * width]
+    for g in grades:
+        rows.append(["№", "Время"] + [x for L in letters for x in (f"{g}{L}", "каб." if cab_header else "")])
+        for n, t in enumerate(TIMES[:lessons], 1):
+            row = [str(n), t]
+            split = rnd.random() < 0.15  # деление на группы: второй предмет строкой ниже
+            for _L in letters:
+                if rnd.random() < 0.1:
+                    row += ["", ""]
+                else:
+                    row += [rnd.choice(SUBJECTS), rnd.choice(CABS)]
+            rows.append(row)
+            if split:
+                rows.append(["", ""] + [x for _L in letters for x in ("Информатика (2 гр.)", rnd.choice(CABS))])
+        rows.append([""] * width)
+    return rows
+
+
+def sheet_csv(**kw) -> str:
+    buf = io.StringIO()
+    csv.writer(buf, lineterminator="\r\n").writerows(sheet_rows(**kw))
+    return buf.getvalue()
+
+
+XLSX_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+# xlsx-выгрузка Google Sheets: стили ячеек (индекс -> numFmtId), свои форматы с id от 164
+XLSX_FMTS = {164: "dd.mm.yyyy", 165: "h:mm", 166: "0.00", 167: '[$-419]dd.mm.yy" г."'}
+XLSX_XFS = [0, 164, 165, 166, 167, 14, 20, 10]
+
+
+def workbook_cells():
+    """Лист с типизированными ячейками: (строки в xlsx как (тип, значение, стиль), строки CSV-выгрузки)."""
+    n = lambda v, s=0: ("n", v, s)  # noqa: E731
+    t = lambda v: ("s", v, 0)  # noqa: E731
+    rows = [
+        [t("Расписание уроков на"), n("46000", 1), ("inlineStr", "версия", 0), n("3")],
+        [t("№"), t("Время"), t("7А"), t("каб."), t("Начало"), t("Часы"), t("Доля")],
+        [n("1"), t("8:30-9:15"), t("Алгебра"), t("Б1-12"), n("0.3541666666666667", 2), n("0.75", 3), n("0.125", 7)],
+        [n("2"), t("9:25-10:10"), t("Физика & <химия>"), n("214"), n("0.3923611111111111", 6), n("2.5", 3), ("b", "1", 0)],
+        [n("3"), t("10:25-11:10"), t(""), t(""), n("0.43402777777777773", 2), n("1.25"), ("str", "итого", 0)],
+        [n("46001", 5), n("46002.5", 4), t("Русский язык")],
+    ]
+    shown = [
+        ["Расписание уроков на", "09.12.2025", "версия", "3", "", "", ""],
+        ["№", "Время", "7А", "каб.", "Начало", "Часы", "Доля"],
+        ["1", "8:30-9:15", "Алгебра", "Б1-12", "8:30", "0,75", "12,50%"],
+        ["2", "9:25-10:10", "Физика & <химия>", "214", "9:25", "2,50", "TRUE"],
+        ["3", "10:25-11:10", "", "", "10:25", "1,25", "итого"],
+        ["10.12.2025", "11.12.25 г.", "Русский язык", "", "", "", ""],
+    ]
+    return rows, shown
+
+
+def workbook() -> bytes:
+    """xlsx из двух листов (типизированный и обычный sheet_rows) — как отдаёт export?format=xlsx."""
+    typed, _shown = workbook_cells()
+    plain = [[("s", v, 0) for v in r] for r in sheet_rows()]
+    strings = sorted({v for sheet in (typed, plain) for r in sheet for k, v, _s in r if k == "s"})
+    index = {s: i for i, s in enumerate(strings)}
+
+    def sheet_xml(rows):
+        out = []
+        for i, r in enumerate(rows, 1):
+            cells = []
+            for j, (kind, v, style) in enumerate(r):
+                ref = f"{chr(65 + j)}{i}"
+                if kind == "s" and not v:
+                    continue
+                if kind == "inlineStr":
+                    cells.append(f'<c r="{ref}" t="inlineStr"><is><t>{escape(v)}</t></is></c>')
+                elif kind == "s":
+                    cells.append(f'<c r="{ref}" t="s"><v>{index[v]}</v></c>')
+                else:
+                    attr = f' t="{kind}"' if kind != "n" else ""
+                    cells.append(f'<c r="{ref}" s="{style}"{attr}><v>{escape(v)}</v></c>')
+            out.append(f'<row r="{i}">{"".join(cells)}</row>')
+        return (f'<worksheet xmlns="{XLSX_NS}"><sheetData>{"".join(out)}</sheetData></worksheet>')
+
+    fmts = "".join(f'<numFmt numFmtId="{i}" formatCode="{escape(c, {chr(34): "&quot;"})}"/>' for i, c in XLSX_FMTS.items())
+    xfs = "".join(f'<xf numFmtId="{i}"/>' for i in XLSX_XFS)
+    rel = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+    files = {
+        "xl/workbook.xml": f'<workbook xmlns="{XLSX_NS}" xmlns:r="{rel}"><sheets>'
+                           f'<sheet name="Типы" sheetId="1" r:id="rId1"/><sheet name="7 классы" sheetId="2" r:id="rId2"/>'
+                           f'</sheets></workbook>',
+        "xl/_rels/workbook.xml.rels": '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                                      f'<Relationship Id="rId1" Type="{rel}/worksheet" Target="worksheets/sheet1.xml"/>'
+                                      f'<Relationship Id="rId2" Type="{rel}/worksheet" Target="worksheets/sheet2.xml"/>'
+                                      '</Relationships>',
+        "xl/styles.xml": f'<styleSheet xmlns="{XLSX_NS}"><numFmts>{fmts}</numFmts><cellXfs>{xfs}</cellXfs></styleSheet>',
+        "xl/sharedStrings.xml": f'<sst xmlns="{XLSX_NS}">'
+                                + "".join(f"<si><t>{escape(s)}</t></si>" for s in strings) + "</sst>",
+        "xl/worksheets/sheet1.xml": sheet_xml(typed),
+        "xl/worksheets/sheet2.xml": sheet_xml(plain),
+    }
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, text in files.items():
+            zf.writestr(zipfile.ZipInfo(name, (2025, 9, 1, 0, 0, 0)), '<?xml version="1.0" encoding="UTF-8"?>' + text)
+    return buf.getvalue()
+
+
+def workbook_csv() -> str:
+    """CSV-выгрузка листа «Типы»: то, что показывает таблица."""
+    buf = io.StringIO()
+    csv.writer(buf, lineterminator="\r\n").writerows(workbook_cells()[1])
+    return buf.getvalue()
+
+
+def write_all():
+    FIXTURES.mkdir(exist_ok=True)
+    (FIXTURES / "school_page.html").write_text(school_page(), encoding="utf-8")
+    (FIXTURES / "htmlview.html").write_text(htmlview(), encoding="utf-8")
+    (FIXTURES / "sheet.csv").write_text(sheet_csv(), encoding="utf-8", newline="")
+    (FIXTURES / "workbook.xlsx").write_bytes(workbook())
+    (FIXTURES / "workbook.csv").write_text(workbook_csv(), encoding="utf-8", newline="")
+
+
+if __name__ == "__main__":
+    write_all()
@@ -0,0 +1,195 @@
+"""Исходные (до оптимизаций) реализации — эталон для сравнения скорости и результата."""
+import re
+from typing import Dict, List, Optional, Set, Tuple
+from urllib.parse import urljoin, urlparse, parse_qs
+
+from bs4 import BeautifulSoup
+
+from pokrovsky_bot import parser as P
+from pokrovsky_bot.models import SLink
+from pokrovsky_bot.state import CLASS_PURE_RX, SECTION_RX, TITLE_RX, EXCLUDE_SUBSTRINGS
+from pokrovsky_bot.utils import norm, norm_soft
+
+
+def parse_links(html_text: str, page_url: str) -> List[SLink]:
+    soup = BeautifulSoup(html_text, "html.parser")
+    cur_section, out = None, []
+    for el in soup.find_all(True):
+        text = norm(el.get_text(" ", strip=True))
+        m = SECTION_RX.search(text)
+        if m:
+            cur_section = int(m.group(1)) if m.group(1).isdigit() else None
+            continue
+        if cur_section != 1:
+            continue
+        for a in el.find_all("a", href=True):
+            title = norm(a.get_text(" ", strip=True))
+            if any(x in title.lower() for x in EXCLUDE_SUBSTRINGS):
+                continue
+            m2 = TITLE_RX.search(title)
+            if m2:
+                out.append(SLink(title=title, url=urljoin(page_url, a["href"]), date=m2.group(1)))
+    uniq = {(l.title, l.url): l for l in out}
+    res = list(uniq.values())
+    def sort_key(x: SLink):
+        dd, mm = x.date.split(".")
+        return (int(mm), int(dd))
+    res.sort(key=sort_key, reverse=True)
+    return res
+
+
+def parse_sheets_meta(html_text: str) -> Tuple[Dict[str, str], Set[str]]:
+    soup = BeautifulSoup(html_text, "html.parser")
+    gid2title: Dict[str, str] = {}
+    for a in soup.find_all("a", href=True):
+        if "gid=" in a["href"]:
+            gid = parse_qs(urlparse(a["href"]).query).get("gid", ["0"])[0]
+            title = (a.get("aria-label") or a.get_text(" ", strip=True) or "").strip()
+            if title:
+                gid2title[gid] = title
+    for m in re.finditer(r'"gid"\s*:\s*(\d+).*?"title"\s*:\s*"([^"]+)"', html_text, flags=re.DOTALL):
+        gid2title.setdefault(m.group(1), m.group(2))
+    for m in re.finditer(r'"sheetId"\s*:\s*(\d+).*?"title"\s*:\s*"([^"]+)"', html_text, flags=re.DOTALL):
+        gid2title.setdefault(m.group(1), m.group(2))
+    gids: Set[str] = set(
+        re.findall(r"[?&]gid=(\d+)", html_text)
+        + re.findall(r'data-gid="(\d+)"', html_text)
+        + re.findall(r'gid\\?":\s*"?(\d+)"?', html_text)
+    )
+    if not gids:
+        gids.add("0")
+    return gid2title, gids
+
+
+# --- парсер листа до Grid: каждая ячейка нормализуется заново при каждом обращении ---
+
+
+def parse_header_row(row: List[str]) -> Optional[Tuple[int, Dict[str, int]]]:
+    """Строка-шапка: (колонка «время», {класс: колонка}) или None."""
+    cells = [norm(c) for c in row]
+    time_cols = [j for j, c in enumerate(cells) if "время" in (c or "").lower()]
+    if not time_cols:
+        return None
+    found: Dict[str, int] = {}
+    for j, cell in enumerate(cells):
+        label = P.parse_class_label(cell)
+        if label:
+            found[label] = j
+    return time_cols[0], found
+
+
+def parse_headers(rows: List[List[str]]) -> Tuple[Dict[str, Tuple[int, int, int]], List[int]]:
+    labels: Dict[str, Tuple[int, int, int]] = {}
+    headers: List[int] = []
+    for i, row in enumerate(rows[:P.HEADER_SCAN_ROWS]):
+        hdr = parse_header_row(row)
+        if hdr is None:
+            continue
+        time_col, found = hdr
+        headers.append(i)
+        for label, j in found.items():
+            labels[label] = (i, time_col, j)
+    return labels, headers
+
+
+def detect_cab_col(
+    rows: List[List[str]],
+    hdr: int,
+    subj_col: int,
+    end_row: int,
+    right_bound: int,
+    col_hits: Optional[Dict[Tuple[int, int], int]] = None,
+) -> Optional[int]:
+    """col_hits — общий для всех классов полосы счётчик «сколько кабинетов в колонке» (ключ: шапка, колонка)."""
+    for cand in range(subj_col + 1, min(subj_col + 4, right_bound) + 1):
+        if cand < len(rows[hdr]) and "каб" in norm(rows[hdr][cand]).lower():
+            return cand
+    best, hits = None, -1
+    for cand in range(subj_col + 1, min(subj_col + 4, right_bound) + 1):
+        cnt = col_hits.get((hdr, cand)) if col_hits is not None else None
+        if cnt is None:
+            cnt = 0
+            for row in rows[hdr + 1 : min(end_row, hdr + 19)]:
+                if cand < len(row) and P.extract_cabinet(row[cand]):
+                    cnt += 1
+            if col_hits is not None:
+                col_hits[(hdr, cand)] = cnt
+        if cnt > hits:
+            best, hits = cand, cnt
+    return best if hits > 0 else None
+
+
+def build_cab_map(
+    rows: List[List[str]],
+    labels: Dict[str, Tuple[int, int, int]],
+    headers: List[int]
+) -> Dict[str, Tuple[Optional[int], int]]:
+    total_cols, total_rows = max((len(r) for r in rows), default=0), len(rows)
+    m: Dict[str, Tuple[Optional[int], int]] = {}
+    col_hits: Dict[Tuple[int, int], int] = {}
+    for lb, (hdr, _t, subj_col) in labels.items():
+        end = P.next_header(headers, hdr, total_rows)
+        right = P.right_boundary(labels, headers, lb, total_cols)
+        m[lb] = (detect_cab_col(rows, hdr, subj_col, end, right, col_hits), right)
+    return m
+
+
+def extract_schedule(
+    rows: List[List[str]],
+    labels: Dict[str, Tuple[int, int, int]],
+    headers: List[int],
+    label: str,
+    cab_info: Tuple[Optional[int], int],
+):
+    hdr, time_col, subj_col = labels[label]
+    end = P.next_header(headers, hdr, len(rows))
+    _cab_col, right_bound = cab_info
+    out: List[Tuple[str, Optional[str], Optional[str]]] = []
+
+    r = hdr + 1
+    while r < end:
+        row = rows[r]
+        subj_cell = row[subj_col] if subj_col < len(row) else ""
+        subj = norm_soft(subj_cell).strip() or None
+        if subj and CLASS_PURE_RX.match(subj):
+            break
+
+        t_here = norm_soft(row[time_col]) if time_col < len(row) else ""
+        t_next = norm_soft(rows[r + 1][time_col]) if (r + 1) < end and time_col < len(rows[r + 1]) else ""
+
+        if subj and t_next and not t_here and (r + 1) < end:
+            time_range = P._normalize_time(t_next)
+            cab = None
+            cc = subj_col + 1
+            if cc <= right_bound and cc < len(rows[r + 1]):
+                cab = P.extract_cabinet(rows[r + 1][cc])
+            out.append((time_range, subj, cab))
+            r += 2
+            continue
+
+        time_range = P._normalize_time(t_here)
+        cab = None
+        if subj:
+            if (r + 1) < end:
+                cc = subj_col + 1
+                if cc <= right_bound and cc < len(rows[r + 1]):
+                    cab = P.extract_cabinet(rows[r + 1][cc])
+            if not cab:
+                cc0 = subj_col + 1
+                if cc0 < len(row) and cc0 <= right_bound:
+                    cab = P.extract_cabinet(row[cc0])
+
+        if not time_range and not subj:
+            r += 1
+            continue
+
+        out.append((time_range, subj, cab))
+        r += 1
+
+    return out
+
+
+def schedule_all(rows: List[List[str]]) -> Dict[str, list]:
+    labels, headers = parse_headers(rows)
+    cab_map = build_cab_map(rows, labels, headers)
+    return {lb: P.collapse_by_time(extract_schedule(rows, labels, headers, lb, cab_map[lb])) for lb in labels}
@@ -0,0 +1,133 @@
+"""Офлайн-бенчмарки разбора: сайт, htmlview, парсер листа, рендер.
+
+    python bench/run.py                              # все кейсы, JSON в bench/results/<время>.json
+    python bench/run.py -k parser --repeat 100       # только кейсы с «parser» в имени
+    python bench/run.py --compare bench/results/before.json
+
+Для каждого кейса: пропускная способность, задержка p50/p95/p99 и пик памяти (tracemalloc).
+"""
+import argparse
+import csv
+import json
+import platform
+import subprocess
+import sys
+from datetime import datetime
+from io import StringIO
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+from common import BENCH, measure
+
+import fixtures
+from pokrovsky_bot import parser
+from pokrovsky_bot.sheets import parse_sheets_meta
+from pokrovsky_bot.site import parse_links
+
+PAGE_URL = "https://pokrovsky.gosuslugi.ru/glavnoe/raspisanie/"
+
+
+def _fixture(name: str) -> str:
+    return (BENCH / "fixtures" / name).read_text(encoding="utf-8")
+
+
+def cases() -> List[Tuple[str, Callable[[], object]]]:
+    page, view, sheet = _fixture("school_page.html"), _fixture("htmlview.html"), _fixture("sheet.csv")
+    rows = list(csv.reader(StringIO(sheet, newline="")))
+    wide = fixtures.sheet_rows(grades=(5, 6, 7, 8, 9), classes=10)
+    bare = fixtures.sheet_rows(cab_header=False)
+    bare_labels, bare_headers = parser.parse_headers(bare)
+    grid, bare_grid = parser.Grid(rows), parser.Grid(bare)
+    labels, headers = parser.parse_headers(grid)
+    cab_map = parser.build_cab_map(grid, labels, headers)
+    items = parser.collapse_by_time(parser.extract_schedule(grid, labels, headers, "7А", cab_map["7А"]))
+    sheet = parser.compile_sheet(rows)
+    wide_sheet = parser.compile_sheet(wide)
+    # правка одной ячейки в одном классе широкого листа
+    wide_labels, _ = parser.parse_headers(wide)
+    hdr, _t, col = wide_labels["7А"]
+    edited = [list(r) for r in wide]
+    edited[hdr + 2][col] = "Физика"
+
+    def all_labels(rws):
+        g = parser.Grid(rws)
+        lb, hd = parser.parse_headers(g)
+        cm = parser.build_cab_map(g, lb, hd)
+        return [parser.collapse_by_time(parser.extract_schedule(g, lb, hd, L, cm[L])) for L in lb]
+
+    return [
+        ("site.parse_links", lambda: parse_links(page, PAGE_URL)),
+        ("sheets.parse_sheets_meta", lambda: parse_sheets_meta(view)),
+        ("parser.grid", lambda: parser.Grid(rows)),
+        ("parser.parse_headers", lambda: parser.parse_headers(grid)),
+        ("parser.build_cab_map", lambda: parser.build_cab_map(grid, labels, headers)),
+        ("parser.build_cab_map_unlabeled", lambda: parser.build_cab_map(bare_grid, bare_labels, bare_headers)),
+        ("parser.extract_schedule+collapse", lambda: parser.collapse_by_time(
+            parser.extract_schedule(grid, labels, headers, "7А", cab_map["7А"]))),
+        ("parser.pretty", lambda: parser.pretty("08.09", "7А", items)),
+        ("parser.compile_sheet", lambda: parser.compile_sheet(rows)),
+        ("parser.compile_sheet_wide", lambda: parser.compile_sheet(edited)),
+        ("parser.compile_sheet_wide_incremental", lambda: parser.compile_sheet(edited, wide_sheet)),
+        # цена одного нажатия на класс: раньше extract_schedule+collapse, теперь поиск в готовом индексе
+        ("tap.compiled_lookup", lambda: sheet.lessons["7А"]),
+        ("tap.render_cached", lambda: parser.render("08.09", "0", sheet, "7А")),
+        ("parser.full_sheet", lambda: all_labels(rows)),
+        ("parser.full_sheet_wide", lambda: all_labels(wide)),
+    ]
+
+
+def _git_rev() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCH, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return ""
+
+
+def compare(before: Dict, after: Dict):
+    print("\nСравнение p50 (было → стало):")
+    for name, r in after["results"].items():
+        old = before.get("results", {}).get(name)
+        if old:
+            print(f"  {name:<36} {old['p50_ms']:9.3f} → {r['p50_ms']:9.3f} мс  x{old['p50_ms'] / r['p50_ms']:.2f}")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("-k", default="", help="подстрока имени кейса")
+    ap.add_argument("--repeat", type=int, default=30)
+    ap.add_argument("--out", help="куда записать JSON (по умолчанию bench/results/<время>.json)")
+    ap.add_argument("--compare", help="JSON прошлого запуска для сравнения")
+    args = ap.parse_args(argv)
+
+    results: Dict[str, Dict[str, float]] = {}
+    print(f"{'кейс':<36} {'оп/с':>10} {'p50 мс':>9} {'p95 мс':>9} {'p99 мс':>9} {'пик КБ':>9}")
+    for name, fn in cases():
+        if args.k not in name:
+            continue
+        r = results[name] = measure(fn, args.repeat)
+        print(f"{name:<36} {r['ops_per_sec']:10.1f} {r['p50_ms']:9.3f} {r['p95_ms']:9.3f} "
+              f"{r['p99_ms']:9.3f} {r['peak_kb']:9.1f}")
+
+    report = {
+        "meta": {
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "git": _git_rev(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    out = Path(args.out or BENCH / "results" / f"{datetime.now():%Y%m%d-%H%M%S}.json")
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nРезультаты: {out}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
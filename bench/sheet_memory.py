@@ -0,0 +1,42 @@
+"""Память на один закэшированный лист: прежнее представление в MATRIX против компактного Sheet.
+
+    python bench/sheet_memory.py
+"""
+import csv
+from io import StringIO
+
+from common import BENCH
+
+import fixtures
+from pokrovsky_bot import parser
+from pokrovsky_bot.utils import deep_sizeof
+
+
+def legacy_entry(rows):
+    """Как MATRIX хранил лист раньше: все строки CSV + метки, шапки, карта кабинетов."""
+    labels, headers = parser.parse_headers(rows)
+    cab_map = parser.build_cab_map(rows, labels, headers)
+    return rows, labels, headers, cab_map
+
+
+def main():
+    # через csv.reader, как после загрузки: у каждой ячейки своя строка
+    texts = {
+        "sheet.csv": (BENCH / "fixtures" / "sheet.csv").read_text(encoding="utf-8"),
+        "wide (5 параллелей x 10)": fixtures.sheet_csv(grades=(5, 6, 7, 8, 9), classes=10),
+    }
+    sheets = {name: list(csv.reader(StringIO(text, newline=""))) for name, text in texts.items()}
+    print(f"{'лист':<28} {'было КБ':>9} {'стало КБ':>9} {'x':>6}")
+    compiled = []
+    for name, rows in sheets.items():
+        old = deep_sizeof(legacy_entry(rows))
+        sheet = parser.compile_sheet(rows)
+        compiled.append(sheet)
+        new = deep_sizeof(sheet)
+        print(f"{name:<28} {old / 1024:9.1f} {new / 1024:9.1f} {old / new:6.1f}")
+    # строки интернированы: одинаковые предметы/время в разных листах занимают память один раз
+    print(f"{'оба листа вместе':<28} {'':>9} {deep_sizeof(compiled) / 1024:9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,7 @@ from aiogram.types import BotCommand
 
 from .config import settings
 from .db import ensure_db
+from .http import open_session, close_session
 from .subscription import SubscriptionMiddleware
 from .handlers import (
     cmd_start, on_main, on_back, on_news,
@@ -57,6 +58,8 @@ def build_bot_dp():
             BotCommand(command="start", description="Посмотреть расписание"),
         ])
 
+    dp.startup.register(open_session)
     dp.startup.register(on_startup)
+    dp.shutdown.register(close_session)
 
     return bot, dp
@@ -16,6 +16,30 @@ class Settings:
     DB_PATH: str = os.getenv("DB_PATH", "bot_stats.sqlite3")
     TZ: str = os.getenv("TZ", "Europe/Moscow")
     USER_AGENT: str = "ScheduleBot/1.0"
+    HTTP_LIMIT: int = int(os.getenv("HTTP_LIMIT", "32"))
+    HTTP_LIMIT_PER_HOST: int = int(os.getenv("HTTP_LIMIT_PER_HOST", "8"))
+    HTTP_CACHE_MAX_MB: int = int(os.getenv("HTTP_CACHE_MAX_MB", "64"))
+    HTTP_CACHE_TTL_DAYS: int = int(os.getenv("HTTP_CACHE_TTL_DAYS", "7"))
+    GOOGLE_URL_TTL: int = int(os.getenv("GOOGLE_URL_TTL", "3600"))
+    SHEETS_META_TTL: int = int(os.getenv("SHEETS_META_TTL", "900"))
+    SHEETS_LOCALE: str = os.getenv("SHEETS_LOCALE", "ru")
+    SUB_CACHE_TTL: int = int(os.getenv("SUB_CACHE_TTL", "600"))
+    SUB_CACHE_NEGATIVE_TTL: int = int(os.getenv("SUB_CACHE_NEGATIVE_TTL", "30"))
+    SUB_CACHE_SIZE: int = int(os.getenv("SUB_CACHE_SIZE", "10000"))
+    WATCH_ACTIVE_DAYS: int = int(os.getenv("WATCH_ACTIVE_DAYS", "1"))
+    WATCH_SITE_INTERVAL: int = int(os.getenv("WATCH_SITE_INTERVAL", "300"))
+    WATCH_HOT_INTERVAL: int = int(os.getenv("WATCH_HOT_INTERVAL", "120"))
+    WATCH_MIN_INTERVAL: int = int(os.getenv("WATCH_MIN_INTERVAL", "300"))
+    WATCH_MAX_INTERVAL: int = int(os.getenv("WATCH_MAX_INTERVAL", "21600"))
+    WATCH_BACKOFF_HOURS: float = float(os.getenv("WATCH_BACKOFF_HOURS", "12"))
+    BROADCAST_RATE: float = float(os.getenv("BROADCAST_RATE", "25"))
+    BROADCAST_MAX_ATTEMPTS: int = int(os.getenv("BROADCAST_MAX_ATTEMPTS", "5"))
+    BROADCAST_RETENTION_DAYS: int = int(os.getenv("BROADCAST_RETENTION_DAYS", "30"))
+    WATCH_DIGEST_DELAY: int = int(os.getenv("WATCH_DIGEST_DELAY", "0"))
+    ANNOUNCE_WAVE_SIZE: int = int(os.getenv("ANNOUNCE_WAVE_SIZE", "200"))
+    ANNOUNCE_WAVE_INTERVAL: int = int(os.getenv("ANNOUNCE_WAVE_INTERVAL", "60"))
+    WATCH_RESOLVE_WORKERS: int = int(os.getenv("WATCH_RESOLVE_WORKERS", "4"))
+    WATCH_FETCH_WORKERS: int = int(os.getenv("WATCH_FETCH_WORKERS", "4"))
 
 
 settings = Settings()
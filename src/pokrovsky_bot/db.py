@@ -1,5 +1,6 @@
+import json
 import sqlite3
-from typing import Optional, Tuple, Dict
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
 from .config import settings
 from .utils import fmt_msk
 
@@ -13,7 +14,9 @@ def ensure_db():
     DB.executescript("""
     CREATE TABLE IF NOT EXISTS users(
       user_id INTEGER PRIMARY KEY, first_name TEXT, username TEXT,
-      joined_at TEXT, last_seen TEXT, msg_count INTEGER DEFAULT 0);
+      joined_at TEXT, last_seen TEXT, msg_count INTEGER DEFAULT 0,
+      active INTEGER NOT NULL DEFAULT 1,  -- 0: бот заблокирован / аккаунт удалён, рассылки не шлём
+      inactive_reason TEXT, inactive_at TEXT);
     CREATE TABLE IF NOT EXISTS events(
       id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL,
       ts TEXT NOT NULL, type TEXT NOT NULL, meta TEXT,
@@ -23,7 +26,9 @@ def ensure_db():
       date_label TEXT PRIMARY KEY,         -- '08.09'
       link_url   TEXT NOT NULL,
       google_url TEXT,
-      created_at TEXT NOT NULL
+      created_at TEXT NOT NULL,
+      archived   INTEGER NOT NULL DEFAULT 0,  -- дата прошла, наблюдатель её больше не опрашивает
+      next_check TEXT                         -- когда наблюдателю снова скачивать таблицу
     );
     -- хэши листов (чтобы видеть правки)
     CREATE TABLE IF NOT EXISTS sheet_hashes(
@@ -32,9 +37,78 @@ def ensure_db():
       title      TEXT,
       hash       TEXT NOT NULL,
       updated_at TEXT NOT NULL,
+      changed_at TEXT,                     -- когда содержимое в последний раз менялось
       PRIMARY KEY(date_label, gid)
     );
-    """); DB.commit()
+    -- отпечатки уроков каждого класса на листе (чтобы знать, чьё расписание поменялось)
+    CREATE TABLE IF NOT EXISTS class_hashes(
+      date_label TEXT NOT NULL,
+      gid        TEXT NOT NULL,
+      label      TEXT NOT NULL,
+      hash       TEXT NOT NULL,
+      PRIMARY KEY(date_label, gid, label)
+    );
+    -- какие классы смотрел пользователь (кому слать уведомления о правках)
+    CREATE TABLE IF NOT EXISTS user_labels(
+      user_id    INTEGER NOT NULL,
+      label      TEXT NOT NULL,
+      updated_at TEXT NOT NULL,
+      PRIMARY KEY(user_id, label)
+    );
+    CREATE INDEX IF NOT EXISTS user_labels_label ON user_labels(label);
+    -- рассылки: текст один раз, получатели — в outbox (переживает перезапуск)
+    CREATE TABLE IF NOT EXISTS broadcasts(
+      id         INTEGER PRIMARY KEY AUTOINCREMENT,
+      text       TEXT NOT NULL,
+      total      INTEGER NOT NULL DEFAULT 0,
+      created_at TEXT NOT NULL,
+      done_at    TEXT
+    );
+    CREATE TABLE IF NOT EXISTS outbox(
+      broadcast_id INTEGER NOT NULL,
+      user_id      INTEGER NOT NULL,
+      status       TEXT NOT NULL DEFAULT 'pending',  -- pending / sent / failed
+      attempts     INTEGER NOT NULL DEFAULT 0,
+      next_try     TEXT,
+      error        TEXT,
+      PRIMARY KEY(broadcast_id, user_id),
+      FOREIGN KEY(broadcast_id) REFERENCES broadcasts(id)
+    );
+    CREATE INDEX IF NOT EXISTS outbox_pending ON outbox(broadcast_id, user_id) WHERE status='pending';
+    -- HTTP-кэш для условных запросов (ETag / Last-Modified)
+    CREATE TABLE IF NOT EXISTS http_cache(
+      url           TEXT PRIMARY KEY,
+      etag          TEXT,
+      last_modified TEXT,
+      body          TEXT NOT NULL,
+      size          INTEGER NOT NULL,
+      updated_at    TEXT NOT NULL,
+      used_at       TEXT  -- когда ответ последний раз пригодился (304): по нему вытесняем
+    );
+    """)
+    _add_column("schedules", "archived", "INTEGER NOT NULL DEFAULT 0")
+    _add_column("schedules", "next_check", "TEXT")
+    _add_column("sheet_hashes", "changed_at", "TEXT")
+    _add_column("users", "active", "INTEGER NOT NULL DEFAULT 1")
+    _add_column("users", "inactive_reason", "TEXT")
+    _add_column("users", "inactive_at", "TEXT")
+    _add_column("http_cache", "used_at", "TEXT")
+    DB.execute("CREATE INDEX IF NOT EXISTS users_active ON users(user_id) WHERE active=1")
+    if not DB.execute("SELECT 1 FROM user_labels LIMIT 1").fetchone():
+        # первый запуск с user_labels: заполняем по истории просмотров
+        DB.execute("""
+        INSERT OR IGNORE INTO user_labels(user_id, label, updated_at)
+        SELECT user_id, substr(meta, instr(meta, '|') + 1), MAX(ts) FROM events
+        WHERE type='show_schedule' AND instr(meta, '|') > 0
+        GROUP BY user_id, substr(meta, instr(meta, '|') + 1)
+        """)
+    DB.commit()
+
+
+def _add_column(table: str, column: str, decl: str):
+    """Миграция старых баз: колонки, которых не было при создании таблицы."""
+    if column not in {r[1] for r in DB.execute(f"PRAGMA table_info({table})")}:
+        DB.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
 
 
 def now_utc() -> str:
@@ -47,7 +121,9 @@ def upsert_user(u):
         return
     uid, first, uname = u.id, (u.first_name or "").strip(), (u.username or "").strip()
     if DB.execute("SELECT 1 FROM users WHERE user_id=?", (uid,)).fetchone():
-        DB.execute("UPDATE users SET first_name=?, username=?, last_seen=?, msg_count=msg_count+1 WHERE user_id=?",
+        # написал боту — значит, снова достижим для рассылок
+        DB.execute("UPDATE users SET first_name=?, username=?, last_seen=?, msg_count=msg_count+1, "
+                   "active=1, inactive_reason=NULL, inactive_at=NULL WHERE user_id=?",
                    (first, uname, now_utc(), uid))
     else:
         DB.execute("INSERT INTO users(user_id,first_name,username,joined_at,last_seen,msg_count) VALUES (?,?,?,?,?,1)",
@@ -55,6 +131,19 @@ def upsert_user(u):
     DB.commit()
 
 
+def user_deactivate(uid: int, reason: str):
+    """Пользователь недостижим (blocked / deactivated / chat_not_found): убираем из рассылок до его следующего сообщения."""
+    DB.execute("UPDATE users SET active=0, inactive_reason=?, inactive_at=? WHERE user_id=?", (reason, now_utc(), uid))
+    DB.execute("UPDATE outbox SET status='failed', error=? WHERE user_id=? AND status='pending'", (reason, uid))
+
+
+def users_reach() -> Tuple[int, Dict[str, int]]:
+    """(активных, {причина: неактивных})"""
+    active = DB.execute("SELECT COUNT(*) FROM users WHERE active=1").fetchone()[0]
+    cur = DB.execute("SELECT COALESCE(inactive_reason, '?'), COUNT(*) FROM users WHERE active=0 GROUP BY 1")
+    return active, dict(cur.fetchall())
+
+
 def log_event(uid: int, t: str, meta: str = ""):
     if DB is None:
         return
@@ -67,9 +156,44 @@ def sched_get_all() -> Dict[str, Tuple[str, Optional[str]]]:
     return {d: (lu, gu) for d, lu, gu in cur.fetchall()}
 
 
+def sched_get_active() -> Dict[str, Tuple[str, Optional[str]]]:
+    """Как sched_get_all, но без архивных дат."""
+    cur = DB.execute("SELECT date_label, link_url, google_url FROM schedules WHERE archived=0")
+    return {d: (lu, gu) for d, lu, gu in cur.fetchall()}
+
+
+def sched_archive(date_labels: Iterable[str]):
+    DB.executemany("UPDATE schedules SET archived=1 WHERE date_label=?", [(d,) for d in date_labels])
+    DB.commit()
+
+
+def sched_poll_info() -> Dict[str, Tuple[str, Optional[str], Optional[str]]]:
+    """{date_label: (created_at, последняя правка любой вкладки, next_check)} для неархивных дат"""
+    cur = DB.execute("""
+        SELECT s.date_label, s.created_at, MAX(h.changed_at), s.next_check
+        FROM schedules s LEFT JOIN sheet_hashes h ON h.date_label = s.date_label
+        WHERE s.archived=0 GROUP BY s.date_label""")
+    return {d: (c, ch, nc) for d, c, ch, nc in cur.fetchall()}
+
+
+def sched_set_next_check(date_label: str, when: str):
+    DB.execute("UPDATE schedules SET next_check=? WHERE date_label=?", (when, date_label))
+    DB.commit()
+
+
+def sched_counts() -> Tuple[int, int]:
+    """(активных дат, архивных)"""
+    row = DB.execute("SELECT COALESCE(SUM(archived=0), 0), COALESCE(SUM(archived=1), 0) FROM schedules").fetchone()
+    return row[0], row[1]
+
+
 def sched_upsert(date_label: str, link_url: str, google_url: Optional[str]):
     if DB.execute("SELECT 1 FROM schedules WHERE date_label=?", (date_label,)).fetchone():
-        DB.execute("UPDATE schedules SET link_url=?, google_url=? WHERE date_label=?", (link_url, google_url, date_label))
+        # сменилась ссылка (та же дата через год) — снова в работе и опросить сразу;
+        # нажатия пользователей не возвращают дату из архива и не сдвигают опрос
+        DB.execute("UPDATE schedules SET archived=CASE WHEN link_url=? THEN archived ELSE 0 END, "
+                   "next_check=CASE WHEN link_url=? THEN next_check END, link_url=?, google_url=? WHERE date_label=?",
+                   (link_url, link_url, link_url, google_url, date_label))
     else:
         DB.execute("INSERT INTO schedules(date_label, link_url, google_url, created_at) VALUES (?,?,?,?)",
                    (date_label, link_url, google_url, now_utc()))
@@ -81,11 +205,161 @@ def hash_get(date_label: str, gid: str) -> Optional[str]:
     return row[0] if row else None
 
 
-def hash_set(date_label: str, gid: str, title: str, h: str):
+def hash_set(date_label: str, gid: str, title: str, h: str, changed: bool = True):
+    """changed=False — хэш пересчитан (новый формат), а содержимое то же: changed_at не трогаем."""
     if DB.execute("SELECT 1 FROM sheet_hashes WHERE date_label=? AND gid=?", (date_label, gid)).fetchone():
-        DB.execute("UPDATE sheet_hashes SET title=?, hash=?, updated_at=? WHERE date_label=? AND gid=?",
-                   (title, h, now_utc(), date_label, gid))
+        DB.execute("UPDATE sheet_hashes SET title=?, hash=?, updated_at=?, changed_at=CASE WHEN ? THEN ? ELSE changed_at END "
+                   "WHERE date_label=? AND gid=?",
+                   (title, h, now_utc(), changed, now_utc(), date_label, gid))
     else:
-        DB.execute("INSERT INTO sheet_hashes(date_label, gid, title, hash, updated_at) VALUES (?,?,?,?,?)",
-                   (date_label, gid, title, h, now_utc()))
+        DB.execute("INSERT INTO sheet_hashes(date_label, gid, title, hash, updated_at, changed_at) VALUES (?,?,?,?,?,?)",
+                   (date_label, gid, title, h, now_utc(), now_utc()))
+    DB.commit()
+
+
+def class_hashes_get(date_label: str, gid: str) -> Optional[Dict[str, str]]:
+    """None — отпечатков вкладки ещё не снимали; {} — сняли, а классов на вкладке нет."""
+    cur = DB.execute("SELECT label, hash FROM class_hashes WHERE date_label=? AND gid=?", (date_label, gid))
+    rows = dict(cur.fetchall())
+    if not rows:
+        return None
+    rows.pop("", None)
+    return rows
+
+
+def class_hashes_set(date_label: str, gid: str, hashes: Dict[str, str]):
+    DB.execute("DELETE FROM class_hashes WHERE date_label=? AND gid=?", (date_label, gid))
+    # строка с пустым классом — метка «отпечатки сняты», чтобы вкладку без классов не путать с новой
+    DB.executemany("INSERT INTO class_hashes(date_label, gid, label, hash) VALUES (?,?,?,?)",
+                   [(date_label, gid, lb, h) for lb, h in {"": "", **hashes}.items()])
+    DB.commit()
+
+
+def user_label_touch(uid: int, label: str):
+    if DB is None:
+        return
+    DB.execute("INSERT OR REPLACE INTO user_labels(user_id, label, updated_at) VALUES (?,?,?)", (uid, label, now_utc()))
+    DB.commit()
+
+
+def user_labels_for(labels: Iterable[str]) -> Dict[int, Set[str]]:
+    """{user_id: какие из labels он смотрел}"""
+    labels = list(labels)
+    out: Dict[int, Set[str]] = {}
+    if not labels:
+        return out
+    q = f"SELECT user_id, label FROM user_labels WHERE label IN ({','.join('?' * len(labels))})"
+    for uid, label in DB.execute(q, labels):
+        out.setdefault(uid, set()).add(label)
+    return out
+
+
+def outbox_enqueue(text: str, users: Optional[Iterable[int]] = None, exclude: Iterable[int] = (),
+                   wave_size: int = 0, wave_interval: int = 0) -> int:
+    """Новая рассылка; users=None — всем активным пользователям, кроме exclude (список выбирается в самой SQLite)."""
+    bid = DB.execute("INSERT INTO broadcasts(text, created_at) VALUES (?,?)", (text, now_utc())).lastrowid
+    if users is None:
+        DB.execute("INSERT INTO outbox(broadcast_id, user_id) SELECT ?, user_id FROM users "
+                   "WHERE active=1 AND user_id NOT IN (SELECT value FROM json_each(?))", (bid, json.dumps(list(exclude))))
+    else:
+        DB.executemany("INSERT OR IGNORE INTO outbox(broadcast_id, user_id) SELECT ?, user_id FROM users "
+                       "WHERE user_id=? AND active=1", ((bid, u) for u in users))
+    DB.execute("UPDATE broadcasts SET total=(SELECT COUNT(*) FROM outbox WHERE broadcast_id=?) WHERE id=?", (bid, bid))
+    if wave_size > 0:
+        # волна n (с нуля) уходит через n * wave_interval сек.; первыми — кто заходил недавно
+        DB.execute("""
+            UPDATE outbox SET next_try = strftime('%Y-%m-%dT%H:%M:%S+00:00', 'now', '+' || (w.n * ?) || ' seconds')
+            FROM (SELECT o.user_id AS uid, (ROW_NUMBER() OVER (ORDER BY u.last_seen DESC, o.user_id) - 1) / ? AS n
+                  FROM outbox o LEFT JOIN users u ON u.user_id = o.user_id WHERE o.broadcast_id=?) w
+            WHERE outbox.broadcast_id=? AND outbox.user_id=w.uid AND w.n > 0""",
+                   (wave_interval, wave_size, bid, bid))
+    DB.commit()
+    return bid
+
+
+def outbox_next(after: Tuple[int, int], limit: int) -> List[Tuple[int, int, int, str]]:
+    """Следующие готовые к отправке после (broadcast_id, user_id): [(broadcast_id, user_id, attempts, text)]."""
+    return DB.execute("""
+        SELECT o.broadcast_id, o.user_id, o.attempts, b.text FROM outbox o JOIN broadcasts b ON b.id = o.broadcast_id
+        WHERE o.status='pending' AND (o.broadcast_id, o.user_id) > (?, ?) AND (o.next_try IS NULL OR o.next_try <= ?)
+        ORDER BY o.broadcast_id, o.user_id LIMIT ?""", (*after, now_utc(), limit)).fetchall()
+
+
+def outbox_mark(broadcast_id: int, user_id: int, status: str, error: Optional[str] = None,
+                next_try: Optional[str] = None, attempt: bool = True):
+    DB.execute("UPDATE outbox SET status=?, error=?, next_try=?, attempts=attempts+? WHERE broadcast_id=? AND user_id=?",
+               (status, error, next_try, int(attempt), broadcast_id, user_id))
+
+
+def outbox_finish():
+    """Фиксирует отметки и закрывает рассылки, в которых никого не осталось."""
+    DB.execute("""UPDATE broadcasts SET done_at=? WHERE done_at IS NULL AND NOT EXISTS
+                  (SELECT 1 FROM outbox WHERE broadcast_id=broadcasts.id AND status='pending')""", (now_utc(),))
+    DB.commit()
+
+
+def outbox_progress(limit: int = 5) -> List[Tuple[int, str, int, int, int, int, Optional[str]]]:
+    """Последние рассылки: [(id, created_at, total, sent, failed, pending, done_at)]"""
+    return DB.execute("""
+        SELECT b.id, b.created_at, b.total,
+               COALESCE(SUM(o.status='sent'), 0), COALESCE(SUM(o.status='failed'), 0), COALESCE(SUM(o.status='pending'), 0),
+               b.done_at
+        FROM (SELECT * FROM broadcasts ORDER BY id DESC LIMIT ?) b LEFT JOIN outbox o ON o.broadcast_id = b.id
+        GROUP BY b.id ORDER BY b.id DESC""", (limit,)).fetchall()
+
+
+def outbox_prune():
+    """Удаляет получателей, а затем и сами рассылки, закрытые раньше чем BROADCAST_RETENTION_DAYS назад."""
+    from datetime import datetime, timedelta, timezone
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=settings.BROADCAST_RETENTION_DAYS)).replace(microsecond=0).isoformat()
+    old = "SELECT id FROM broadcasts WHERE done_at IS NOT NULL AND done_at < ?"
+    DB.execute(f"DELETE FROM outbox WHERE broadcast_id IN ({old})", (cutoff,))
+    DB.execute(f"DELETE FROM broadcasts WHERE id IN ({old})", (cutoff,))
+    DB.commit()
+
+
+def http_cache_get(url: str) -> Optional[Tuple[Optional[str], Optional[str], Union[str, bytes], int]]:
+    """return (etag, last_modified, body, size)"""
+    if DB is None:
+        return None
+    return DB.execute("SELECT etag, last_modified, body, size FROM http_cache WHERE url=?", (url,)).fetchone()
+
+
+def http_cache_set(url: str, etag: Optional[str], last_modified: Optional[str], body: Union[str, bytes]):
+    if DB is None:
+        return
+    size = len(body) if isinstance(body, bytes) else len(body.encode("utf-8"))
+    DB.execute("INSERT OR REPLACE INTO http_cache(url, etag, last_modified, body, size, updated_at, used_at) "
+               "VALUES (?,?,?,?,?,?,?)", (url, etag, last_modified, body, size, now_utc(), now_utc()))
+    http_cache_sweep()
+
+
+def http_cache_touch(url: str):
+    """Ответ пригодился (304) — дольше не вытесняется."""
+    if DB is None:
+        return
+    DB.execute("UPDATE http_cache SET used_at=? WHERE url=?", (now_utc(), url))
+    DB.commit()
+
+
+def http_cache_sweep():
+    """Удаляет ответы, не нужные дольше HTTP_CACHE_TTL_DAYS, и самые давние сверх HTTP_CACHE_MAX_MB."""
+    from datetime import datetime, timedelta, timezone
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=settings.HTTP_CACHE_TTL_DAYS)).replace(microsecond=0).isoformat()
+    DB.execute("DELETE FROM http_cache WHERE COALESCE(used_at, updated_at) < ?", (cutoff,))
+    DB.execute("""
+        DELETE FROM http_cache WHERE url IN (
+          SELECT url FROM (
+            SELECT url, SUM(size) OVER (ORDER BY COALESCE(used_at, updated_at) DESC, rowid DESC) AS total FROM http_cache
+          ) WHERE total > ?
+        )""", (settings.HTTP_CACHE_MAX_MB * 1024 * 1024,))
+    DB.commit()
+
+
+def http_cache_drop(urls: Iterable[str] = (), prefixes: Iterable[str] = ()):
+    """Забыть ответы по точным адресам и по началу адреса (все выгрузки одной таблицы)."""
+    if DB is None:
+        return
+    DB.executemany("DELETE FROM http_cache WHERE url=?", [(u,) for u in urls])
+    DB.executemany("DELETE FROM http_cache WHERE substr(url, 1, length(?))=?", [(p, p) for p in prefixes])
     DB.commit()
@@ -1,15 +1,27 @@
 import asyncio
-import csv
-from io import StringIO
-from typing import Dict, List, Optional, Set, Tuple
-import aiohttp
-from .config import HEADERS
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
 from .db import sched_upsert
-from .http import fetch_text
-from .sheets import resolve_google_url, sheets_meta, csv_url
+from .sheets import resolve_google_url, sheets_meta, get_rows_from_csv, get_workbook
 from .site import get_links_from_site
 from .state import DOC_URL, GID_BY_GRADE, MATRIX, LINKS
-from .parser import parse_headers, build_cab_map, grade_from_label
+from .models import Sheet
+from .parser import parse_header_row, compile_sheet, grade_from_label, HEADER_SCAN_ROWS
+
+INFLIGHT: Dict[Tuple, asyncio.Future] = {}
+# анонсированная дата -> [из готового MATRIX, с загрузкой]: сколько выборов класса после анонса
+# обслужено без похода в Google
+SERVED: Dict[str, List[int]] = {}
+
+
+def track_served(date: str):
+    """Начать счёт с момента анонса даты."""
+    SERVED[date] = [0, 0]
+
+
+def note_served(date: str, warm: bool):
+    if date in SERVED:
+        SERVED[date][0 if warm else 1] += 1
+
 
 async def ensure_links():
     global LINKS
@@ -17,12 +29,66 @@ async def ensure_links():
         LINKS = await get_links_from_site()
 
 
-async def get_rows_from_csv(g_url: str, gid: str) -> List[List[str]]:
-    text = await fetch_text(csv_url(g_url, gid))
-    return [list(r) for r in csv.reader(StringIO(text))]
+async def single_flight(key: Tuple, factory: Callable[[], Awaitable[Any]]) -> Any:
+    """Конкурентные вызовы с одинаковым ключом ждут один общий future."""
+    fut = INFLIGHT.get(key)
+    if fut is None:
+        fut = asyncio.ensure_future(factory())
+        INFLIGHT[key] = fut
+
+        def _done(f: asyncio.Future):
+            if INFLIGHT.get(key) is f:
+                del INFLIGHT[key]
+            if not f.cancelled():
+                f.exception()  # чтобы не было "exception was never retrieved"
+        fut.add_done_callback(_done)
+    return await asyncio.shield(fut)
+
+
+def remember_sheet(date: str, gid: str, sheet: Sheet):
+    """Кладёт разобранный лист в MATRIX и переназначает его классы в GID_BY_GRADE (для наблюдателя)."""
+    MATRIX[(date, gid)] = sheet
+    by_grade = GID_BY_GRADE.setdefault(date, {})
+    grades = {grade_from_label(L) for L in sheet.labels} - {None}
+    for g, mapped in list(by_grade.items()):
+        if mapped == gid and g not in grades:
+            del by_grade[g]  # класса на этой вкладке больше нет
+    for g in grades:
+        cur = by_grade.get(g)
+        other = MATRIX.get((date, cur)) if cur else None
+        if cur is None or other is None or g not in {grade_from_label(L) for L in other.labels}:
+            by_grade[g] = gid
+
+
+def forget_date(date: str):
+    """Дата ушла в архив — разобранные листы больше не держим."""
+    for key in [k for k in MATRIX if k[0] == date]:
+        del MATRIX[key]
+    GID_BY_GRADE.pop(date, None)
+
+
+async def load_sheet(date: str, g_url: str, gid: str, rows: Optional[List[List[str]]] = None):
+    async def load():
+        nonlocal rows
+        if rows is None:
+            rows = await get_rows_from_csv(g_url, gid)
+        MATRIX[(date, gid)] = compile_sheet(rows)
+        return MATRIX[(date, gid)]
+    if (date, gid) in MATRIX:
+        return MATRIX[(date, gid)]
+    return await single_flight(("gid", date, gid), load)
 
 
 async def ensure_sheet_for_grade(date: str, grade: int):
+    gid = GID_BY_GRADE.get(date, {}).get(grade)
+    if gid and (date, gid) in MATRIX and date in DOC_URL:
+        note_served(date, True)
+        return DOC_URL[date], gid, MATRIX[(date, gid)]
+    note_served(date, False)
+    return await single_flight(("grade", date, grade), lambda: _ensure_sheet_for_grade(date, grade))
+
+
+async def _ensure_sheet_for_grade(date: str, grade: int):
     g_url = DOC_URL.get(date)
     if not g_url:
         await ensure_links()
@@ -33,44 +99,63 @@ async def ensure_sheet_for_grade(date: str, grade: int):
 
     if date in GID_BY_GRADE and grade in GID_BY_GRADE[date]:
         gid = GID_BY_GRADE[date][grade]
-        if (date, gid) not in MATRIX:
-            rows = await get_rows_from_csv(g_url, gid)
-            labels, headers = parse_headers(rows)
-            MATRIX[(date, gid)] = (rows, labels, headers, build_cab_map(rows, labels, headers))
-        return g_url, GID_BY_GRADE[date][grade], MATRIX[(date, GID_BY_GRADE[date][grade])]
+        return g_url, gid, await load_sheet(date, g_url, gid)
 
     gid2title, gids = await sheets_meta(g_url)
     from .state import parse_class_label
     quick = {grade_from_label(parse_class_label(t) or ""): gid for gid, t in gid2title.items()}
     if grade in quick and quick[grade]:
         gid = quick[grade]
-        rows = await get_rows_from_csv(g_url, gid)
-        labels, headers = parse_headers(rows)
-        MATRIX[(date, gid)] = (rows, labels, headers, build_cab_map(rows, labels, headers))
+        payload = await load_sheet(date, g_url, gid)
         GID_BY_GRADE.setdefault(date, {})[grade] = gid
-        return g_url, gid, MATRIX[(date, gid)]
-
-    async with aiohttp.ClientSession(headers=HEADERS) as session:
-        sem = asyncio.Semaphore(6)
-        async def try_gid(gid):
-            async with sem:
-                try:
-                    from .sheets import csv_url as _csv_url
-                    async with session.get(_csv_url(g_url, gid)) as r:
-                        r.raise_for_status()
-                        txt = await r.text()
-                    rws = [list(r) for r in csv.reader(StringIO(txt))]
-                    lm, hr = parse_headers(rws)
-                    if grade in {grade_from_label(L) for L in lm}:
-                        return gid, rws, lm, hr
-                except Exception:
-                    return None
-        tasks = [asyncio.create_task(try_gid(g)) for g in (list(gids) or ["0"])]
-        for t in asyncio.as_completed(tasks):
-            res = await t
-            if res:
-                gid, rows, labels, headers = res
-                MATRIX[(date, gid)] = (rows, labels, headers, build_cab_map(rows, labels, headers))
-                GID_BY_GRADE.setdefault(date, {})[grade] = gid
-                return g_url, gid, MATRIX[(date, gid)]
+        return g_url, gid, payload
+
+    # вся книга одним запросом: раскладываем все вкладки сразу
+    try:
+        book = await single_flight(("book", date), lambda: get_workbook(g_url, gid2title))
+    except Exception:
+        book = {}
+    hit = None
+    for gid, rows in book.items():
+        payload = await load_sheet(date, g_url, gid, rows)
+        for g in {grade_from_label(L) for L in payload.labels}:
+            GID_BY_GRADE.setdefault(date, {}).setdefault(g, gid)
+        if hit is None and grade in {grade_from_label(L) for L in payload.labels}:
+            hit = gid, payload
+    if hit:
+        GID_BY_GRADE.setdefault(date, {})[grade] = hit[0]
+        return g_url, hit[0], hit[1]
+
+    sem = asyncio.Semaphore(6)
+    async def try_gid(gid):
+        found = False
+
+        def stop(rows: List[List[str]]) -> bool:
+            # бросаем загрузку чужой вкладки, как только шапки нужного класса уже не будет
+            nonlocal found
+            hdr = parse_header_row(rows[-1]) if len(rows) <= HEADER_SCAN_ROWS else None
+            if hdr and any(grade_from_label(L) == grade for L in hdr[1]):
+                found = True
+            return not found and len(rows) >= HEADER_SCAN_ROWS
+
+        async with sem:
+            try:
+                if (date, gid) in MATRIX:
+                    payload = MATRIX[(date, gid)]
+                    found = grade in {grade_from_label(L) for L in payload.labels}
+                else:
+                    rows = await get_rows_from_csv(g_url, gid, stop=stop)
+                    payload = await load_sheet(date, g_url, gid, rows) if found else None
+                if found:
+                    return gid, payload
+            except Exception:
+                return None
+    rest = [g for g in (list(gids) or ["0"]) if g not in book]
+    tasks = [asyncio.create_task(try_gid(g)) for g in rest]
+    for t in asyncio.as_completed(tasks):
+        res = await t
+        if res:
+            gid, payload = res
+            GID_BY_GRADE.setdefault(date, {})[grade] = gid
+            return g_url, gid, payload
     raise RuntimeError("Не нашёл вкладку для выбранного номера класса.")
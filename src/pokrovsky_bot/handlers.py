@@ -6,10 +6,10 @@ from aiogram import F
 from aiogram.filters import Command
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton, BotCommand
 from .config import settings
-from .db import upsert_user, log_event
+from .db import upsert_user, log_event, user_label_touch
 from .keyboard import MAIN_KB
 from .models import SLink
-from .parser import collapse_by_time, extract_schedule, pretty, grade_from_label
+from .parser import render, grade_from_label
 from .sheets import resolve_google_url, sheets_meta
 from .site import get_links_from_site
 from .state import (
@@ -82,12 +82,12 @@ async def on_back(m: Message):
         date, gid, grade = st.get("date"), st.get("gid"), st.get("grade")
         if not (date and gid and grade is not None):
             return await show_dates(m)
-        rows, labels, _hr, _cab = MATRIX.get((date, gid), (None, None, None, None))
-        if rows is None:
+        sheet = MATRIX.get((date, gid))
+        if sheet is None:
             from .ensure import ensure_sheet_for_grade  # local import to avoid cycle
-            rows, labels, hr, cab = (await ensure_sheet_for_grade(date, grade))[2]
-            MATRIX[(date, gid)] = (rows, labels, hr, cab)
-        ks = [L for L in labels if grade_from_label(L) == grade]
+            sheet = (await ensure_sheet_for_grade(date, grade))[2]
+            MATRIX[(date, gid)] = sheet
+        ks = [L for L in sheet.labels if grade_from_label(L) == grade]
         await m.answer("Выбери класс:", reply_markup=kb_labels(date, gid, ks))
         STATE[m.chat.id] = {"step": "classes", "date": date, "gid": gid, "grade": grade}
 
@@ -117,7 +117,10 @@ async def on_pick_date(c: CallbackQuery):
     quick = {grade_from_label(parse_class_label(t) or ""): gid for gid, t in gid2title.items()}
     grades = [g for g in quick.keys() if g and 5 <= g <= 11]
     if grades:
-        GID_BY_GRADE[link.date] = {g: quick[g] for g in grades}
+        # наблюдатель уже мог разложить классы по вкладкам по их содержимому — это точнее названий вкладок
+        by_grade = GID_BY_GRADE.setdefault(link.date, {})
+        for g in grades:
+            by_grade.setdefault(g, quick[g])
         await replace_loader(loader, f"Выбери номер класса ({link.date}):", reply_markup=kb_grades(link.date, grades))
     else:
         await replace_loader(loader, f"Выбери номер класса ({link.date}):", reply_markup=kb_grades(link.date, list(range(5, 12))))
@@ -140,7 +143,9 @@ async def ask_grades(msg_target: Message, date: str):
     quick = {grade_from_label(parse_class_label(t) or ""): gid for gid, t in gid2title.items()}
     grades = [g for g in quick.keys() if g and 5 <= g <= 11]
     if grades:
-        GID_BY_GRADE[date] = {g: quick[g] for g in grades}
+        by_grade = GID_BY_GRADE.setdefault(date, {})
+        for g in grades:
+            by_grade.setdefault(g, quick[g])
         await msg_target.answer(f"Выбери номер класса ({date}):", reply_markup=kb_grades(date, grades))
     else:
         await msg_target.answer(f"Выбери номер класса ({date}):", reply_markup=kb_grades(date, list(range(5, 12))))
@@ -156,8 +161,7 @@ async def on_pick_grade(c: CallbackQuery):
         _g_url, gid, payload = await ensure_sheet_for_grade(date, grade)
     except Exception as e:
         return await replace_loader(loader, f"Не нашёл вкладку: {e}")
-    rows, labels, _hr, _cab = payload
-    ks = [L for L in labels if grade_from_label(L) == grade]
+    ks = [L for L in payload.labels if grade_from_label(L) == grade]
     await replace_loader(loader, "Выбери класс:", reply_markup=kb_labels(date, gid, ks))
     STATE[c.message.chat.id] = {"step": "classes", "date": date, "gid": gid, "grade": grade}
 
@@ -176,14 +180,14 @@ async def on_pick_label(c: CallbackQuery):
         except Exception as e:
             return await replace_loader(loader, f"Ошибка доступа к листу: {e}")
 
-    rows, labels, headers, cab_map = MATRIX[(date, gid)]
+    sheet = MATRIX[(date, gid)]
     key = klass.upper()
-    if key not in labels:
+    if key not in sheet.lessons:
         return await replace_loader(loader, "Такой класс не нашёлся на листе.")
-    items = collapse_by_time(extract_schedule(rows, labels, headers, key, cab_map.get(key, (None, 0))))
-    await replace_loader(loader, pretty(date, key, items), parse_mode="HTML")
+    await replace_loader(loader, render(date, gid, sheet, key), parse_mode="HTML")
     STATE[c.message.chat.id] = {"step": "shown", "date": date, "gid": gid, "grade": grade_from_label(key), "klass": key}
     log_event(c.from_user.id, "show_schedule", f"{date}|{key}")
+    user_label_touch(c.from_user.id, key)
 
 
 def is_admin(uid: int) -> bool:
@@ -194,8 +198,13 @@ async def cmd_admin(m: Message):
     if not is_admin(m.from_user.id):
         return await m.answer("⛔ Доступ запрещён.")
     upsert_user(m.from_user)
-    from .db import DB
-    from .utils import fmt_msk
+    from .db import DB, sched_counts, outbox_progress, users_reach
+    from .http import CACHE_STATS
+    from .watcher import WATCH_STATS, ANNOUNCED
+    from .ensure import SERVED
+    from .sheets import GOOGLE_URLS, META
+    from .parser import RENDERED, band_stats, cabinet_cache_stats
+    from .utils import fmt_msk, deep_sizeof
 
     tu = DB.execute("SELECT COUNT(*) FROM users").fetchone()[0]
     te = DB.execute("SELECT COUNT(*) FROM events").fetchone()[0]
@@ -221,13 +230,37 @@ async def cmd_admin(m: Message):
            "🏆 <b>Топ 10 по активности</b>"]
     msg += [f"• {ulabel(r)}" for r in top] or ["— нет данных —"]
     msg += ["", "📝 <b>Последние 10 событий</b>"] + ([f"• {eline(r)}" for r in last] or ["— нет данных —"])
-    await m.answer("".join(msg), parse_mode="HTML")
+    cs = CACHE_STATS
+    msg += ["", "🌐 <b>HTTP-кэш</b>",
+            f"• 304 из кэша: <b>{cs['hit']}</b> / условных запросов: <b>{cs['revalidate']}</b> / полных загрузок: <b>{cs['miss']}</b>",
+            f"• Сэкономлено: <b>{cs['saved_bytes'] // 1024} КБ</b>",
+            f"• Кэш ссылок на таблицы: <b>{GOOGLE_URLS.stats()}</b>, кэш вкладок: <b>{META.stats()}</b>",
+            f"• Готовые сообщения расписания: <b>{RENDERED.stats()}</b>",
+            f"• Кэш подписки на канал: <b>{MEMBERS.stats()}</b>, сэкономлено вызовов API: <b>{MEMBERS.hits}</b>",
+            f"• Листов в памяти: <b>{len(MATRIX)}</b> ({deep_sizeof(MATRIX) // 1024} КБ)",
+            f"• Кэш кабинетов: <b>{cabinet_cache_stats()}</b>",
+            f"• Полосы классов, взятые из прошлой версии листа: <b>{band_stats()}</b>"]
+    ws, (n_active, n_archived) = WATCH_STATS, sched_counts()
+    msg += ["", "👀 <b>Наблюдатель</b>",
+            f"• Дат в работе: <b>{n_active}</b>, в архиве: <b>{n_archived}</b>",
+            f"• Последний цикл ({fmt_msk(ws['at'])}, {ws['seconds']} с): дат <b>{ws['dates']}</b>, "
+            f"HTTP-запросов <b>{ws['requests']}</b>, ушло в архив <b>{ws['archived']}</b>"]
+    msg += ["• Анонсы новых дат (выборов класса после анонса из готового кэша / всего):"]
+    msg += [f"  {d} ({fmt_msk(at)}): <b>{SERVED.get(d, [0, 0])[0]}</b> / {sum(SERVED.get(d, [0, 0]))}"
+            for d, at in sorted(ANNOUNCED.items(), key=lambda x: x[1])[-5:]] or ["  — нет данных —"]
+    n_reach, lost = users_reach()
+    msg += ["", "📣 <b>Рассылки</b>",
+            f"• Получают: <b>{n_reach}</b>, выключены: " + (", ".join(f"{k} {v}" for k, v in lost.items()) or "0"),
+            "• Последние (отправлено / ошибок / в очереди из всего):"]
+    msg += [f"  #{bid} {fmt_msk(created)}: <b>{sent}</b> / {failed} / {pending} из {total}" + (" ✅" if done else "")
+            for bid, created, total, sent, failed, pending, done in outbox_progress()] or ["— нет данных —"]
+    await m.answer("\n".join(msg), parse_mode="HTML")
 
 from aiogram import Bot
 from aiogram.types import CallbackQuery
 from aiogram.exceptions import TelegramBadRequest
 from .config import settings
-from .subscription import ALLOWED_STATUSES, make_sub_keyboard
+from .subscription import ALLOWED_STATUSES, MEMBERS, make_sub_keyboard, remember_membership
 
 async def on_check_subscription(cb: CallbackQuery, bot: Bot):
     try:
@@ -236,6 +269,7 @@ async def on_check_subscription(cb: CallbackQuery, bot: Bot):
         pass
 
     user_id = cb.from_user.id
+    MEMBERS.pop(user_id)  # пользователь просит перепроверить — кэшированный ответ больше не в счёт
 
     ok = False
     try:
@@ -243,6 +277,7 @@ async def on_check_subscription(cb: CallbackQuery, bot: Bot):
         ok = getattr(member, "status", None) in ALLOWED_STATUSES
     except TelegramBadRequest:
         ok = False
+    remember_membership(user_id, ok)
 
     if ok:
         if cb.message:
@@ -1,15 +1,120 @@
-from typing import Optional
+import codecs
+from typing import AsyncIterator, Optional
 import aiohttp
 
-from .config import HEADERS
+from .config import HEADERS, settings
+from .db import http_cache_get, http_cache_set, http_cache_touch
 
-async def fetch_text(url: str, session: Optional[aiohttp.ClientSession] = None) -> str:
-    timeout = aiohttp.ClientTimeout(total=35)
-    if session is None:
-        async with aiohttp.ClientSession(timeout=timeout, headers=HEADERS) as s:
-            async with s.get(url) as r:
-                r.raise_for_status()
-                return await r.text()
-    async with session.get(url) as r:
+TIMEOUT = aiohttp.ClientTimeout(total=35, connect=10, sock_connect=10, sock_read=25)
+SESSION: Optional[aiohttp.ClientSession] = None
+# hit — 304 и тело из кэша, revalidate — сервер ответил на условный запрос (304 или новое тело),
+# miss — кэшируемый ответ скачан целиком, requests — всего HTTP-запросов (с неудачными)
+CACHE_STATS = {"hit": 0, "revalidate": 0, "miss": 0, "saved_bytes": 0, "requests": 0}
+
+
+async def open_session() -> aiohttp.ClientSession:
+    """Общий keep-alive клиент на весь процесс (создаётся на старте диспетчера или лениво)."""
+    global SESSION
+    if SESSION is None or SESSION.closed:
+        connector = aiohttp.TCPConnector(
+            limit=settings.HTTP_LIMIT,
+            limit_per_host=settings.HTTP_LIMIT_PER_HOST,
+            ttl_dns_cache=300,
+            keepalive_timeout=60,
+        )
+        SESSION = aiohttp.ClientSession(connector=connector, timeout=TIMEOUT, headers=HEADERS)
+    return SESSION
+
+
+async def close_session():
+    global SESSION
+    if SESSION is not None and not SESSION.closed:
+        await SESSION.close()
+    SESSION = None
+
+
+def _conditional(url: str, cache: bool):
+    cached = http_cache_get(url) if cache else None
+    headers = {}
+    if cached:
+        etag, last_modified, _body, _size = cached
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+    CACHE_STATS["requests"] += 1
+    return cached, headers
+
+
+def _answered(headers, cache: bool):
+    """Новое тело получено целиком: только теперь считаем условный запрос и промах (таймаут и 5xx — нет)."""
+    if headers:
+        CACHE_STATS["revalidate"] += 1
+    if cache:
+        CACHE_STATS["miss"] += 1
+
+
+def _cache_hit(url: str, cached):
+    CACHE_STATS["revalidate"] += 1
+    http_cache_touch(url)
+    CACHE_STATS["hit"] += 1
+    CACHE_STATS["saved_bytes"] += cached[3]
+    return cached[2]
+
+
+async def iter_text(
+    url: str,
+    session: Optional[aiohttp.ClientSession] = None,
+    cache: bool = True,
+    chunk_size: int = 64 * 1024,
+) -> AsyncIterator[str]:
+    """Отдаёт тело ответа по кускам по мере загрузки (с условными запросами к кэшу).
+
+    Если ответ кэшируется (есть ETag / Last-Modified — у Google почти всегда), куски копятся до конца
+    для записи в кэш: память на тело это не экономит, экономит только ожидание первого куска.
+    """
+    s = session or await open_session()
+    cached, headers = _conditional(url, cache)
+    async with s.get(url, headers=headers) as r:
+        if r.status == 304 and cached:
+            body = _cache_hit(url, cached)
+            for i in range(0, len(body), chunk_size):
+                yield body[i:i + chunk_size]
+            return
+        r.raise_for_status()
+        etag, last_modified = r.headers.get("ETag"), r.headers.get("Last-Modified")
+        parts = [] if cache and (etag or last_modified) else None
+        decoder = codecs.getincrementaldecoder(r.charset or "utf-8")(errors="replace")
+        async for raw in r.content.iter_chunked(chunk_size):
+            text = decoder.decode(raw)
+            if text:
+                if parts is not None:
+                    parts.append(text)
+                yield text
+        text = decoder.decode(b"", final=True)
+        if text:
+            if parts is not None:
+                parts.append(text)
+            yield text
+    _answered(headers, cache)
+    if parts is not None:
+        http_cache_set(url, etag, last_modified, "".join(parts))
+
+
+async def fetch_text(url: str, session: Optional[aiohttp.ClientSession] = None, cache: bool = True) -> str:
+    return "".join([chunk async for chunk in iter_text(url, session, cache)])
+
+
+async def fetch_bytes(url: str, session: Optional[aiohttp.ClientSession] = None, cache: bool = True) -> bytes:
+    s = session or await open_session()
+    cached, headers = _conditional(url, cache)
+    async with s.get(url, headers=headers) as r:
+        if r.status == 304 and cached:
+            return _cache_hit(url, cached)
         r.raise_for_status()
-        return await r.text()
+        body = await r.read()
+        etag, last_modified = r.headers.get("ETag"), r.headers.get("Last-Modified")
+    _answered(headers, cache)
+    if cache and (etag or last_modified):
+        http_cache_set(url, etag, last_modified, body)
+    return body
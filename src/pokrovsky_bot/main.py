@@ -1,5 +1,6 @@
 import asyncio
 from .bot import build_bot_dp
+from .outbox import outbox_worker
 from .watcher import watch_loop
 
 
@@ -9,6 +10,7 @@ def main():
     async def run():
         import asyncio as _asyncio
         _asyncio.create_task(watch_loop(bot))
+        _asyncio.create_task(outbox_worker(bot))
         await dp.start_polling(bot)
 
     asyncio.run(run())
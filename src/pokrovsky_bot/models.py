@@ -1,7 +1,26 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import Dict, NamedTuple, Optional, Tuple
 
 @dataclass
 class SLink:
     title: str
     url: str
     date: str
+
+
+class Lesson(NamedTuple):
+    time: str
+    subject: str
+    cab: Optional[str]
+
+
+@dataclass(slots=True)
+class Sheet:
+    """Лист в кэше: только готовые уроки по классам (строки CSV после разбора не храним)."""
+    lessons: Dict[str, Tuple[Lesson, ...]] = field(default_factory=dict)
+    digest: str = ""  # rows_hash содержимого — версия листа для кэшей
+    bands: Dict[str, Tuple[str, ...]] = field(default_factory=dict)  # band_key полосы -> её классы
+
+    @property
+    def labels(self):
+        return self.lessons.keys()
@@ -0,0 +1,118 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramBadRequest, TelegramForbiddenError, TelegramNetworkError, TelegramRetryAfter, TelegramServerError,
+)
+
+from .config import settings
+from .db import outbox_enqueue, outbox_finish, outbox_mark, outbox_next, outbox_prune, user_deactivate
+
+BATCH = 100
+IDLE = 5  # сек. между проверками пустой очереди (новая рассылка будит раньше)
+WAKE = asyncio.Event()
+
+
+class TokenBucket:
+    """Не больше rate отправок в секунду на всех; pause() — общая пауза по flood-wait."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.capacity = burst or rate
+        self.tokens = self.capacity
+        self.stamp = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+                self.stamp = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def broadcast(text: str, users: Optional[Iterable[int]] = None, exclude: Iterable[int] = (),
+              wave_size: int = 0, wave_interval: int = 0) -> int:
+    """Ставит рассылку в очередь (users=None — всем, кроме exclude); доставляет outbox_worker.
+
+    wave_size > 0 — получатели делятся на волны, каждая следующая отправляется на wave_interval сек. позже.
+    """
+    bid = outbox_enqueue(text, users, exclude, wave_size, wave_interval)
+    WAKE.set()
+    return bid
+
+
+def unreachable(e: Exception) -> Optional[str]:
+    """Причина, по которой пользователю больше не стоит слать рассылки, или None (ошибка не про него)."""
+    text = str(e).lower()
+    if isinstance(e, TelegramForbiddenError):
+        return "deactivated" if "deactivated" in text else "blocked"
+    if isinstance(e, TelegramBadRequest) and "chat not found" in text:
+        return "chat_not_found"
+    return None
+
+
+def _later(seconds: float) -> str:
+    return (datetime.now(timezone.utc) + timedelta(seconds=seconds)).replace(microsecond=0).isoformat()
+
+
+async def _deliver(bot: Bot, bucket: TokenBucket, row: Tuple[int, int, int, str]):
+    bid, uid, attempts, text = row
+    while True:
+        await bucket.acquire()
+        try:
+            await bot.send_message(uid, text, disable_notification=True)
+        except TelegramRetryAfter as e:
+            bucket.pause(e.retry_after)  # flood-wait касается всего бота, а не одного получателя
+            continue
+        except (TelegramNetworkError, TelegramServerError, asyncio.TimeoutError) as e:
+            if attempts + 1 >= settings.BROADCAST_MAX_ATTEMPTS:
+                outbox_mark(bid, uid, "failed", str(e))
+            else:
+                outbox_mark(bid, uid, "pending", str(e), next_try=_later(10 * 2 ** attempts))
+        except Exception as e:
+            outbox_mark(bid, uid, "failed", str(e))
+            reason = unreachable(e)
+            if reason:
+                user_deactivate(uid, reason)
+        else:
+            outbox_mark(bid, uid, "sent")
+        return
+
+
+async def outbox_worker(bot: Bot):
+    """Доставляет очередь outbox с общим лимитом BROADCAST_RATE; после перезапуска продолжает с недоставленных."""
+    bucket = TokenBucket(settings.BROADCAST_RATE)
+    after = (0, 0)
+    while True:
+        WAKE.clear()
+        rows = outbox_next(after, BATCH)
+        if not rows:
+            outbox_finish()
+            if after != (0, 0):
+                after = (0, 0)  # с начала: там могли созреть повторы и появиться новые рассылки
+                continue
+            outbox_prune()  # простой — заодно чистим старые рассылки
+            try:
+                await asyncio.wait_for(WAKE.wait(), IDLE)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        await asyncio.gather(*(_deliver(bot, bucket, r) for r in rows))
+        outbox_finish()
+        after = rows[-1][:2]
@@ -1,8 +1,18 @@
+import hashlib
 import html
 import re
-from typing import Dict, List, Optional, Tuple
+import sys
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
+from .cache import TTLCache
+from .models import Lesson, Sheet
 from .state import CLASS_PURE_RX, CLASS_LABEL_RX, TIME_RX
-from .utils import norm, norm_soft, normalize_hyphens
+from .utils import norm, norm_soft, normalize_hyphens, rows_hash
+
+# готовые сообщения: (дата, gid, класс, версия листа) -> HTML
+RENDERED = TTLCache(maxsize=4096)
+# полосы (шапка + её строки) при пересборке листа: взяты из прошлой версии / разобраны заново
+BAND_STATS = {"reused": 0, "parsed": 0}
 
 HYPHENS = "-\u2010\u2011\u2012\u2013\u2014\u2212"
 HCLASS = re.escape(HYPHENS)
@@ -14,18 +24,30 @@ CAB_CODE_RX = re.compile(
     rf"|(?:\b(спортзал(?:\s*\d*)?|актовый зал|спорт[ .-]?зал|ауд\.?\s*\d+)\b)"
 )
 
+CAB_CACHE_SIZE = 16384
+
 def extract_cabinet(text: Optional[str]) -> Optional[str]:
     if not text:
         return None
+    return _extract_cabinet(text)
+
+@lru_cache(maxsize=CAB_CACHE_SIZE)
+def _extract_cabinet(text: str) -> Optional[str]:
+    # одни и те же ячейки встречаются по многу раз (подбор колонки, разбор каждого класса) — считаем один раз
     for line in normalize_hyphens(norm_soft(text)).split("\n"):
         m = CAB_CODE_RX.search(line)
         if m:
             cab = next((g for g in m.groups() if g), None)
             if cab:
-                import re as _re
-                return _re.sub(r"\s+", "", normalize_hyphens(cab)).upper().replace("Ё", "Е")
+                return re.sub(r"\s+", "", normalize_hyphens(cab)).upper().replace("Ё", "Е")
     return None
 
+def cabinet_cache_stats() -> str:
+    info = _extract_cabinet.cache_info()
+    total = info.hits + info.misses
+    rate = 100 * info.hits / total if total else 0
+    return f"{info.hits}/{total} ({rate:.0f}%), {info.currsize}/{info.maxsize}"
+
 def parse_class_label(cell: str) -> Optional[str]:
     s = norm(cell).upper().replace("Ё", "Е")
     m = CLASS_LABEL_RX.search(s)
@@ -38,22 +60,85 @@ def grade_from_label(label: str) -> Optional[int]:
     m = re.match(r"(\d{1,2})", label)
     return int(m.group(1)) if m else None
 
-def parse_headers(rows: List[List[str]]) -> Tuple[Dict[str, Tuple[int, int, int]], List[int]]:
+CELL_EMPTY, CELL_TEXT, CELL_TIME, CELL_CAB, CELL_TIME_HDR = range(5)
+
+class Cell(NamedTuple):
+    soft: str             # norm_soft: переносы строк сохранены
+    flat: str             # norm: всё в одну строку
+    kind: int             # CELL_*
+    label: Optional[str]  # parse_class_label
+    cab: Optional[str]    # extract_cabinet
+
+EMPTY_CELL = Cell("", "", CELL_EMPTY, None, None)
+
+def classify_cell(raw: str) -> Cell:
+    if not raw:
+        return EMPTY_CELL
+    soft = norm_soft(raw)
+    if not soft:
+        return EMPTY_CELL
+    flat = " ".join(soft.split()) if "\n" in soft else soft
+    cab = extract_cabinet(raw)
+    if "время" in flat.lower():
+        kind = CELL_TIME_HDR
+    elif TIME_RX.search(flat):
+        kind = CELL_TIME
+    elif cab:
+        kind = CELL_CAB
+    else:
+        kind = CELL_TEXT
+    return Cell(soft, flat, kind, parse_class_label(flat), cab)
+
+class Grid:
+    """Лист, где каждая ячейка нормализована и классифицирована ровно один раз (одинаковые строки — общий Cell)."""
+    __slots__ = ("cells", "width")
+
+    def __init__(self, rows: List[List[str]], width: Optional[int] = None, memo: Optional[Dict[str, Cell]] = None) -> None:
+        memo = {} if memo is None else memo
+        out = []
+        for row in rows:
+            cells = []
+            for raw in row:
+                c = memo.get(raw)
+                if c is None:
+                    c = memo[raw] = classify_cell(raw)
+                cells.append(c)
+            out.append(tuple(cells))
+        self.cells: List[Tuple[Cell, ...]] = out
+        self.width = max((len(r) for r in out), default=0) if width is None else width
+
+    def __len__(self) -> int:
+        return len(self.cells)
+
+Rows = Union[List[List[str]], Grid]
+
+def as_grid(rows: Rows) -> Grid:
+    return rows if isinstance(rows, Grid) else Grid(rows)
+
+HEADER_SCAN_ROWS = 400
+
+def _header_cells(cells) -> Optional[Tuple[int, Dict[str, int]]]:
+    time_col = next((j for j, c in enumerate(cells) if c.kind == CELL_TIME_HDR), None)
+    if time_col is None:
+        return None
+    return time_col, {c.label: j for j, c in enumerate(cells) if c.label}
+
+def parse_header_row(row: List[str]) -> Optional[Tuple[int, Dict[str, int]]]:
+    """Строка-шапка: (колонка «время», {класс: колонка}) или None."""
+    return _header_cells([classify_cell(c) for c in row])
+
+def parse_headers(rows: Rows) -> Tuple[Dict[str, Tuple[int, int, int]], List[int]]:
+    grid = as_grid(rows)
     labels: Dict[str, Tuple[int, int, int]] = {}
     headers: List[int] = []
-    for i, row in enumerate(rows[:400]):
-        cells = [norm(c) for c in row]
-        if not any("время" in (c or "").lower() for c in cells):
+    for i, cells in enumerate(grid.cells[:HEADER_SCAN_ROWS]):
+        hdr = _header_cells(cells)
+        if hdr is None:
             continue
-        time_cols = [j for j, c in enumerate(cells) if "время" in (c or "").lower()]
-        if not time_cols:
-            continue
-        time_col = time_cols[0]
+        time_col, found = hdr
         headers.append(i)
-        for j, cell in enumerate(cells):
-            label = parse_class_label(cell)
-            if label:
-                labels[label] = (i, time_col, j)
+        for label, j in found.items():
+            labels[label] = (i, time_col, j)
     return labels, headers
 
 def next_header(headers: List[int], idx: int, total_rows: int) -> int:
@@ -73,31 +158,46 @@ def right_boundary(
     next_cols = [c for c in same if c > subj_col]
     return min(next_cols[0] if next_cols else total_cols, total_cols)
 
-def detect_cab_col(rows: List[List[str]], hdr: int, subj_col: int, end_row: int, right_bound: int) -> Optional[int]:
+def detect_cab_col(
+    rows: Rows,
+    hdr: int,
+    subj_col: int,
+    end_row: int,
+    right_bound: int,
+    col_hits: Optional[Dict[Tuple[int, int], int]] = None,
+) -> Optional[int]:
+    """col_hits — общий для всех классов полосы счётчик «сколько кабинетов в колонке» (ключ: шапка, колонка)."""
+    cells = as_grid(rows).cells
     for cand in range(subj_col + 1, min(subj_col + 4, right_bound) + 1):
-        if cand < len(rows[hdr]) and "каб" in norm(rows[hdr][cand]).lower():
+        if cand < len(cells[hdr]) and "каб" in cells[hdr][cand].flat.lower():
             return cand
     best, hits = None, -1
     for cand in range(subj_col + 1, min(subj_col + 4, right_bound) + 1):
-        cnt = 0
-        for row in rows[hdr + 1 : min(end_row, hdr + 19)]:
-            if cand < len(row) and extract_cabinet(row[cand]):
-                cnt += 1
+        cnt = col_hits.get((hdr, cand)) if col_hits is not None else None
+        if cnt is None:
+            cnt = 0
+            for row in cells[hdr + 1 : min(end_row, hdr + 19)]:
+                if cand < len(row) and row[cand].cab:
+                    cnt += 1
+            if col_hits is not None:
+                col_hits[(hdr, cand)] = cnt
         if cnt > hits:
             best, hits = cand, cnt
     return best if hits > 0 else None
 
 def build_cab_map(
-    rows: List[List[str]],
+    rows: Rows,
     labels: Dict[str, Tuple[int, int, int]],
     headers: List[int]
 ) -> Dict[str, Tuple[Optional[int], int]]:
-    total_cols, total_rows = max((len(r) for r in rows), default=0), len(rows)
+    grid = as_grid(rows)
+    total_cols, total_rows = grid.width, len(grid)
     m: Dict[str, Tuple[Optional[int], int]] = {}
+    col_hits: Dict[Tuple[int, int], int] = {}
     for lb, (hdr, _t, subj_col) in labels.items():
         end = next_header(headers, hdr, total_rows)
         right = right_boundary(labels, headers, lb, total_cols)
-        m[lb] = (detect_cab_col(rows, hdr, subj_col, end, right), right)
+        m[lb] = (detect_cab_col(grid, hdr, subj_col, end, right, col_hits), right)
     return m
 
 def _normalize_time(s: str) -> str:
@@ -106,34 +206,37 @@ def _normalize_time(s: str) -> str:
     return s
 
 def extract_schedule(
-    rows: List[List[str]],
+    rows: Rows,
     labels: Dict[str, Tuple[int, int, int]],
     headers: List[int],
     label: str,
     cab_info: Tuple[Optional[int], int],
 ):
+    cells = as_grid(rows).cells
     hdr, time_col, subj_col = labels[label]
-    end = next_header(headers, hdr, len(rows))
+    end = next_header(headers, hdr, len(cells))
     _cab_col, right_bound = cab_info
     out: List[Tuple[str, Optional[str], Optional[str]]] = []
 
+    def at(r: int, c: int) -> Cell:
+        row = cells[r]
+        return row[c] if c < len(row) else EMPTY_CELL
+
     r = hdr + 1
     while r < end:
-        row = rows[r]
-        subj_cell = row[subj_col] if subj_col < len(row) else ""
-        subj = norm_soft(subj_cell).strip() or None
+        subj = at(r, subj_col).soft or None
         if subj and CLASS_PURE_RX.match(subj):
             break
 
-        t_here = norm_soft(row[time_col]) if time_col < len(row) else ""
-        t_next = norm_soft(rows[r + 1][time_col]) if (r + 1) < end and time_col < len(rows[r + 1]) else ""
+        t_here = at(r, time_col).soft
+        t_next = at(r + 1, time_col).soft if (r + 1) < end else ""
 
         if subj and t_next and not t_here and (r + 1) < end:
             time_range = _normalize_time(t_next)
             cab = None
             cc = subj_col + 1
-            if cc <= right_bound and cc < len(rows[r + 1]):
-                cab = extract_cabinet(rows[r + 1][cc])
+            if cc <= right_bound:
+                cab = at(r + 1, cc).cab
             out.append((time_range, subj, cab))
             r += 2
             continue
@@ -141,14 +244,11 @@ def extract_schedule(
         time_range = _normalize_time(t_here)
         cab = None
         if subj:
-            if (r + 1) < end:
-                cc = subj_col + 1
-                if cc <= right_bound and cc < len(rows[r + 1]):
-                    cab = extract_cabinet(rows[r + 1][cc])
-            if not cab:
-                cc0 = subj_col + 1
-                if cc0 < len(row) and cc0 <= right_bound:
-                    cab = extract_cabinet(row[cc0])
+            cc = subj_col + 1
+            if (r + 1) < end and cc <= right_bound:
+                cab = at(r + 1, cc).cab
+            if not cab and cc <= right_bound:
+                cab = at(r, cc).cab
 
         if not time_range and not subj:
             r += 1
@@ -193,3 +293,91 @@ def pretty(date_label: str, klass: str, items: List[tuple]) -> str:
         lines.append(f"{i} — ({html.escape(t)}) {subj_html}" if show_time else f"{i} — {subj_html}")
         lines.append(f"Кабинет: <b>{html.escape(cab)}</b>" if cab else "Кабинет: <b>—</b>")
     return "\n".join(lines) if items else "Пусто."
+
+def _intern(s: Optional[str]) -> Optional[str]:
+    return sys.intern(s) if s else s
+
+def _lessons(items) -> Tuple[Lesson, ...]:
+    return tuple(Lesson(_intern(t), _intern(s), _intern(c)) for t, s, c in collapse_by_time(items))
+
+def _compile_whole(rows: List[List[str]]) -> Dict[str, Tuple[Lesson, ...]]:
+    grid = Grid(rows)
+    labels, headers = parse_headers(grid)
+    cab_map = build_cab_map(grid, labels, headers)
+    return {
+        sys.intern(lb): _lessons(extract_schedule(grid, labels, headers, lb, cab_map.get(lb, (None, 0))))
+        for lb in labels
+    }
+
+def _compile_band(rows: List[List[str]], width: int, memo: Dict[str, Cell]) -> Dict[str, Tuple[Lesson, ...]]:
+    # rows[0] — шапка; ширина всего листа нужна для правой границы последнего класса
+    grid = Grid(rows, width, memo)
+    time_col, found = _header_cells(grid.cells[0])
+    labels = {lb: (0, time_col, j) for lb, j in found.items()}
+    cab_map = build_cab_map(grid, labels, [0])
+    return {sys.intern(lb): _lessons(extract_schedule(grid, labels, [0], lb, cab_map[lb])) for lb in labels}
+
+def header_rows(rows: List[List[str]]) -> List[int]:
+    # «время» без пробелов, поэтому поиск по сырым ячейкам совпадает с поиском по norm()
+    return [i for i, row in enumerate(rows[:HEADER_SCAN_ROWS]) if any("время" in c.lower() for c in row)]
+
+def band_key(rows: List[List[str]], width: int) -> str:
+    h = hashlib.blake2b(str(width).encode(), digest_size=16)
+    for r in rows:
+        h.update(("\x1f".join(r) + "\x1e").encode("utf-8"))
+    return h.hexdigest()
+
+def compile_sheet(rows: List[List[str]], previous: Optional[Sheet] = None) -> Sheet:
+    """Разбирает лист в компактный Sheet: повторяющиеся строки (время, предметы, кабинеты) интернированы.
+
+    Лист режется на полосы (шапка «время» + строки до следующей шапки); полосы, которые не
+    изменились с previous, не разбираются заново — уроки их классов берутся из previous.
+    """
+    width = max((len(r) for r in rows), default=0)
+    starts = header_rows(rows)
+    lessons: Dict[str, Tuple[Lesson, ...]] = {}
+    bands: Dict[str, Tuple[str, ...]] = {}
+    memo: Dict[str, Cell] = {}  # общий для всех полос: одинаковые ячейки классифицируются один раз
+    for k, start in enumerate(starts):
+        band = rows[start:starts[k + 1] if k + 1 < len(starts) else len(rows)]
+        key = band_key(band, width)
+        old = previous.bands.get(key) if previous is not None else None
+        if old is not None:
+            part = {lb: previous.lessons[lb] for lb in old}
+            BAND_STATS["reused"] += 1
+        else:
+            part = _compile_band(band, width, memo)
+            BAND_STATS["parsed"] += 1
+        if part.keys() & lessons.keys():
+            # класс встречается в нескольких полосах — полосы зависят друг от друга, разбираем целиком
+            return Sheet(_compile_whole(rows), rows_hash(rows))
+        lessons.update(part)
+        bands[key] = tuple(part)
+    return Sheet(lessons, rows_hash(rows), bands)
+
+def class_hashes(sheet: Sheet) -> Dict[str, str]:
+    """Отпечаток разобранных уроков каждого класса: правки вне уроков класса его не меняют."""
+    out = {}
+    for lb, items in sheet.lessons.items():
+        h = hashlib.blake2b(digest_size=16)
+        for t, subj, cab in items:
+            h.update(f"{t}\x1f{subj}\x1f{cab or ''}\x1e".encode("utf-8"))
+        out[lb] = h.hexdigest()
+    return out
+
+def band_stats() -> str:
+    total = BAND_STATS["reused"] + BAND_STATS["parsed"]
+    rate = 100 * BAND_STATS["reused"] / total if total else 0
+    return f"{BAND_STATS['reused']}/{total} ({rate:.0f}%)"
+
+def render(date_label: str, gid: str, sheet: Sheet, klass: str) -> str:
+    key = (date_label, gid, klass, sheet.digest)
+    text = RENDERED.get(key)
+    if text is None:
+        text = pretty(date_label, klass, sheet.lessons.get(klass, []))
+        RENDERED.set(key, text)
+    return text
+
+def drop_rendered(date_label: str, gid: Optional[str] = None):
+    """gid=None — все вкладки даты."""
+    RENDERED.drop(lambda k: k[0] == date_label and (gid is None or k[1] == gid))
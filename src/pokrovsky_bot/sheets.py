@@ -1,10 +1,19 @@
+import asyncio
 import csv
+import html
 import re
-from io import StringIO
-from typing import Dict, List, Optional, Set, Tuple
+from collections import deque
+from contextlib import aclosing
+from typing import AsyncIterator, Callable, Dict, List, Optional, Set, Tuple
 from urllib.parse import urlparse, parse_qs, urlencode, urlunparse
 from bs4 import BeautifulSoup
-from .http import fetch_text
+from .cache import TTLCache
+from .config import settings
+from .http import fetch_bytes, fetch_text, iter_text
+from .xlsx import read_workbook
+
+GOOGLE_URLS = TTLCache(maxsize=256, ttl=settings.GOOGLE_URL_TTL)   # страница даты -> ссылка на таблицу
+META = TTLCache(maxsize=256, ttl=settings.SHEETS_META_TTL)         # ссылка на таблицу -> (gid2title, gids)
 
 
 def _rebuild(url: str, tail: str, extra: Dict[str, str]) -> str:
@@ -22,9 +31,34 @@ def csv_url(url: str, gid: str) -> str:
     return _rebuild(url, "export", {"format": "csv", "gid": gid})
 
 
-async def resolve_google_url(schedule_page_url: str) -> str:
+def xlsx_url(url: str) -> str:
+    return _rebuild(url, "export", {"format": "xlsx"})
+
+
+def doc_prefix(url: str) -> str:
+    """Общее начало всех адресов выгрузок таблицы."""
+    return _rebuild(url, "", {})
+
+
+def invalidate(page_url: Optional[str] = None, google_url: Optional[str] = None):
+    if page_url:
+        GOOGLE_URLS.pop(page_url)
+    if google_url:
+        META.pop(google_url)
+
+
+async def resolve_google_url(schedule_page_url: str, fresh: bool = False) -> str:
     if "docs.google.com/spreadsheets" in schedule_page_url:
         return schedule_page_url
+    cached = None if fresh else GOOGLE_URLS.get(schedule_page_url)
+    if cached:
+        return cached
+    url = await _resolve_google_url(schedule_page_url)
+    GOOGLE_URLS.set(schedule_page_url, url)
+    return url
+
+
+async def _resolve_google_url(schedule_page_url: str) -> str:
     soup = BeautifulSoup(await fetch_text(schedule_page_url), "html.parser")
     iframe = soup.find("iframe", src=lambda s: s and "docs.google.com/spreadsheets" in s)
     if iframe:
@@ -35,30 +69,169 @@ async def resolve_google_url(schedule_page_url: str) -> str:
     raise RuntimeError("Не нашли ссылку на Google Sheets.")
 
 
-async def sheets_meta(google_url: str) -> Tuple[Dict[str, str], Set[str]]:
-    html_text = await fetch_text(htmlview_url(google_url))
-    soup = BeautifulSoup(html_text, "html.parser")
-    gid2title: Dict[str, str] = {}
-    for a in soup.find_all("a", href=True):
-        if "gid=" in a["href"]:
-            gid = parse_qs(urlparse(a["href"]).query).get("gid", ["0"])[0]
-            title = (a.get("aria-label") or a.get_text(" ", strip=True) or "").strip()
-            if title:
-                gid2title[gid] = title
-    for m in re.finditer(r'"gid"\s*:\s*(\d+).*?"title"\s*:\s*"([^"]+)"', html_text, flags=re.DOTALL):
-        gid2title.setdefault(m.group(1), m.group(2))
-    for m in re.finditer(r'"sheetId"\s*:\s*(\d+).*?"title"\s*:\s*"([^"]+)"', html_text, flags=re.DOTALL):
-        gid2title.setdefault(m.group(1), m.group(2))
-    gids: Set[str] = set(
-        re.findall(r"[?&]gid=(\d+)", html_text)
-        + re.findall(r'data-gid="(\d+)"', html_text)
-        + re.findall(r'gid\\?":\s*"?(\d+)"?', html_text)
-    )
+async def sheets_meta(google_url: str, fresh: bool = False) -> Tuple[Dict[str, str], Set[str]]:
+    cached = None if fresh else META.get(google_url)
+    if cached:
+        return cached
+    meta = await _sheets_meta(google_url)
+    META.set(google_url, meta)
+    return meta
+
+
+# Все интересные токены htmlview одной регуляркой без «ленивых» .*? — документ проходится один раз.
+_META_RX = re.compile(
+    r'(?i:<(?P<raw>script|style)\b[^>]*>)'
+    r'|(?i:</(?P<raw_end>script|style)\s*>)'
+    r'|(?i:<a\b(?P<a>[^>]*)>)'
+    r'|(?P<a_end>(?i:</a\s*>))'
+    r'|"(?P<key>gid|sheetId)"\s*:\s*(?P<key_id>\d+)'
+    r'|"title"\s*:\s*"(?P<title>[^"]+)"'
+    r'|[?&]gid=(?P<q_gid>\d+)'
+    r'|data-gid="(?P<d_gid>\d+)"'
+    r'|gid\\?":\s*"?(?P<j_gid>\d+)'
+)
+_GID_RX = re.compile(r'[?&]gid=(\d+)|data-gid="(\d+)"|gid\\?":\s*"?(\d+)')
+_ATTR_RX = re.compile(r'([\w:-]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s"\'>]+))')
+_TAG_RX = re.compile(r"<[^>]*>")
+
+
+def _attrs(tag: str) -> Dict[str, str]:
+    out: Dict[str, str] = {}
+    for m in _ATTR_RX.finditer(tag):
+        out.setdefault(m.group(1).lower(), html.unescape(next((g for g in m.groups()[1:] if g is not None), "")))
+    return out
+
+
+def _anchor_text(body: str) -> str:
+    return " ".join(p for p in (html.unescape(x).strip() for x in _TAG_RX.split(body)) if p)
+
+
+def parse_sheets_meta(html_text: str) -> Tuple[Dict[str, str], Set[str]]:
+    """gid -> название вкладки и все встреченные gid за один линейный проход по htmlview."""
+    anchors: Dict[str, str] = {}
+    by_key: Dict[str, Dict[str, str]] = {"gid": {}, "sheetId": {}}
+    pending: Dict[str, Optional[str]] = {"gid": None, "sheetId": None}
+    gids: Set[str] = set()
+    anchor = None  # (gid, aria-label, конец открывающего тега)
+    in_raw = False  # внутри <script>/<style> теги — просто текст
+
+    def close_anchor(end: int):
+        gid, aria, start = anchor
+        title = (aria or _anchor_text(html_text[start:end])).strip()
+        if title:
+            anchors[gid] = title
+
+    for m in _META_RX.finditer(html_text):
+        kind = m.lastgroup
+        if kind == "raw":
+            in_raw = True
+        elif kind == "raw_end":
+            in_raw = False
+        elif kind == "a":
+            tag = m.group("a")
+            for g in _GID_RX.finditer(tag):
+                gids.add(next(x for x in g.groups() if x))
+            if in_raw:
+                continue
+            attrs = _attrs(tag)
+            href = attrs.get("href")
+            if anchor is not None:
+                close_anchor(m.start())
+            anchor = None
+            if href is not None and "gid=" in href:
+                gid = parse_qs(urlparse(href).query).get("gid", ["0"])[0]
+                anchor = (gid, attrs.get("aria-label"), m.end())
+        elif kind == "a_end":
+            if anchor is not None and not in_raw:
+                close_anchor(m.start())
+                anchor = None
+        elif kind == "key_id":
+            key = m.group("key")
+            if key == "gid":
+                gids.add(m.group("key_id"))
+            if pending[key] is None:
+                pending[key] = m.group("key_id")
+        elif kind == "title":
+            for key, gid in pending.items():
+                if gid is not None:
+                    by_key[key].setdefault(gid, m.group("title"))
+                    pending[key] = None
+        else:
+            gids.add(m.group(kind))
+    if anchor is not None:
+        close_anchor(len(html_text))
+
+    gid2title = anchors
+    for key in ("gid", "sheetId"):
+        for gid, title in by_key[key].items():
+            gid2title.setdefault(gid, title)
     if not gids:
         gids.add("0")
     return gid2title, gids
 
 
-async def get_rows_from_csv(g_url: str, gid: str) -> List[List[str]]:
-    text = await fetch_text(csv_url(g_url, gid))
-    return [list(r) for r in csv.reader(StringIO(text))]
+async def _sheets_meta(google_url: str) -> Tuple[Dict[str, str], Set[str]]:
+    return parse_sheets_meta(await fetch_text(htmlview_url(google_url)))
+
+
+class _Lines:
+    """Очередь готовых строк для csv.reader: читатель берёт строки только когда запись целиком пришла."""
+
+    def __init__(self) -> None:
+        self.q: deque = deque()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        if not self.q:
+            raise StopIteration
+        return self.q.popleft()
+
+
+async def iter_csv_rows(g_url: str, gid: str) -> AsyncIterator[List[str]]:
+    lines = _Lines()
+    reader = csv.reader(lines)
+    tail, quotes, pending = "", 0, 0
+    async for chunk in iter_text(csv_url(g_url, gid)):
+        parts = (tail + chunk).split("\n")
+        tail = parts.pop()
+        for line in parts:
+            lines.q.append(line + "\n"); pending += 1
+            quotes += line.count('"')
+            if quotes % 2 == 0:  # кавычки закрыты — запись (возможно, многострочная) завершена
+                yield next(reader)
+                quotes, pending = 0, 0
+    if tail:
+        lines.q.append(tail); pending += 1
+    if pending:
+        for row in reader:
+            yield row
+
+
+async def get_rows_from_csv(
+    g_url: str,
+    gid: str,
+    stop: Optional[Callable[[List[List[str]]], bool]] = None,
+) -> List[List[str]]:
+    """Скачивает лист потоково; stop(rows) -> True обрывает загрузку (вернутся уже прочитанные строки).
+
+    Потоково только чтение: без stop лист всё равно собирается в список целиком (compile_sheet и rows_hash
+    нужна ширина и все строки), а iter_text держит тело для HTTP-кэша — пик памяти O(лист). Выигрыш —
+    ранний обрыв по stop и разбор CSV по мере прихода, а не после загрузки.
+    """
+    rows: List[List[str]] = []
+    async with aclosing(iter_csv_rows(g_url, gid)) as it:
+        async for row in it:
+            rows.append(row)
+            if stop is not None and stop(rows):
+                break
+    return rows
+
+
+async def get_workbook(g_url: str, gid2title: Dict[str, str]) -> Dict[str, List[List[str]]]:
+    """Вся таблица одним запросом (xlsx): {gid: строки}. Листы без известного gid пропускаются."""
+    data = await fetch_bytes(xlsx_url(g_url))
+    book = await asyncio.to_thread(read_workbook, data, settings.SHEETS_LOCALE)
+    by_title = {t.strip(): rows for t, rows in book.items()}
+    return {gid: by_title[t.strip()] for gid, t in gid2title.items() if t.strip() in by_title}
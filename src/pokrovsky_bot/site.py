@@ -1,36 +1,80 @@
-from typing import List
+from html.parser import HTMLParser
+from typing import List, Optional
 from urllib.parse import urljoin
-from bs4 import BeautifulSoup
 from .config import settings
 from .http import fetch_text
 from .models import SLink
 from .state import SECTION_RX, TITLE_RX, EXCLUDE_SUBSTRINGS
 from .utils import norm
 
+SKIP_TAGS = {"script", "style"}
+TAIL_LEN = 200  # хватает, чтобы заголовок площадки, разбитый тегами, целиком попал в окно
 
-async def get_links_from_site() -> List[SLink]:
-    PAGE_URL = settings.PAGE_URL
-    soup = BeautifulSoup(await fetch_text(PAGE_URL), "html.parser")
-    cur_section, out = None, []
-    for el in soup.find_all(True):
-        text = norm(el.get_text(" ", strip=True))
-        m = SECTION_RX.search(text)
+
+class _LinkExtractor(HTMLParser):
+    """Один проход по документу: следим за текущей «площадкой» и собираем ссылки расписаний."""
+
+    def __init__(self, page_url: str) -> None:
+        super().__init__(convert_charrefs=True)
+        self.page_url = page_url
+        self.section: Optional[int] = None
+        self.tail = ""
+        self.skip = 0
+        self.href: Optional[str] = None
+        self.a_text: List[str] = []
+        self.out: List[SLink] = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self.skip += 1
+        elif tag == "a":
+            href = dict(attrs).get("href")
+            if href:
+                self.href, self.a_text = href, []
+        self.tail += " "
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self.skip = max(0, self.skip - 1)
+        elif tag == "a" and self.href is not None:
+            self._link(norm(" ".join(self.a_text)), self.href)
+            self.href = None
+        self.tail += " "
+
+    def handle_data(self, data):
+        if self.skip:
+            return
+        if self.href is not None:
+            self.a_text.append(data)
+        self.tail = (self.tail + data)[-TAIL_LEN:]
+        m = SECTION_RX.search(self.tail)
         if m:
-            cur_section = int(m.group(1)) if m.group(1).isdigit() else None
-            continue
-        if cur_section != 1:
-            continue
-        for a in el.find_all("a", href=True):
-            title = norm(a.get_text(" ", strip=True))
-            if any(x in title.lower() for x in EXCLUDE_SUBSTRINGS):
-                continue
-            m2 = TITLE_RX.search(title)
-            if m2:
-                out.append(SLink(title=title, url=urljoin(PAGE_URL, a["href"]), date=m2.group(1)))
-    uniq = {(l.title, l.url): l for l in out}
+            self.section = int(m.group(1)) if m.group(1).isdigit() else None
+            self.tail = self.tail[m.end():]
+
+    def _link(self, title: str, href: str):
+        if self.section != 1:
+            return
+        if any(x in title.lower() for x in EXCLUDE_SUBSTRINGS):
+            return
+        m = TITLE_RX.search(title)
+        if m:
+            self.out.append(SLink(title=title, url=urljoin(self.page_url, href), date=m.group(1)))
+
+
+def parse_links(html_text: str, page_url: str) -> List[SLink]:
+    p = _LinkExtractor(page_url)
+    p.feed(html_text)
+    p.close()
+    uniq = {(l.title, l.url): l for l in p.out}
     res = list(uniq.values())
     def sort_key(x: SLink):
         dd, mm = x.date.split(".")
         return (int(mm), int(dd))
     res.sort(key=sort_key, reverse=True)
     return res
+
+
+async def get_links_from_site() -> List[SLink]:
+    PAGE_URL = settings.PAGE_URL
+    return parse_links(await fetch_text(PAGE_URL), PAGE_URL)
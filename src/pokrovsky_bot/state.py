@@ -5,6 +5,8 @@ from aiogram.types import (
     InlineKeyboardMarkup, InlineKeyboardButton, ReplyKeyboardMarkup, KeyboardButton
 )
 
+from .models import Sheet
+
 SECTION_RX = re.compile(r"образовательная\s+площадка\s*№\s*(\d+)", re.IGNORECASE)
 TITLE_RX   = re.compile(r"расписан\w*\s+урок\w*\s+на\s+(\d{2}\.\d{2})", re.IGNORECASE)
 CLASS_LABEL_RX = re.compile(r"(\d{1,2})\s*([^\d\s][^\d]*)", re.UNICODE)
@@ -16,7 +18,7 @@ LINKS: List[Any] = []
 DOC_URL: Dict[str, str] = {}
 GID_BY_GRADE: Dict[str, Dict[int, str]] = {}
 ALL_GIDS: Dict[str, Set[str]] = {}
-MATRIX: Dict[Tuple[str, str], Tuple[Any, Any, Any, Any]] = {}
+MATRIX: Dict[Tuple[str, str], Sheet] = {}
 STATE: Dict[int, Dict[str, Any]] = {}
 
 MAIN_KB = ReplyKeyboardMarkup(
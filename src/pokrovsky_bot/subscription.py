@@ -10,7 +10,17 @@ from aiogram.types import (
     TelegramObject,
 )
 
+from .cache import TTLCache
+from .config import settings
+
 ALLOWED_STATUSES = {"creator", "administrator", "member"}
+# user_id -> подписан ли; попадание в кэш = сэкономленный вызов get_chat_member
+MEMBERS = TTLCache(maxsize=settings.SUB_CACHE_SIZE)
+
+
+def remember_membership(user_id: int, ok: bool) -> None:
+    """Отказ живёт меньше: подписавшийся пользователь не должен долго упираться в старый ответ."""
+    MEMBERS.set(user_id, ok, settings.SUB_CACHE_TTL if ok else settings.SUB_CACHE_NEGATIVE_TTL)
 
 
 def make_sub_keyboard(url: str) -> InlineKeyboardMarkup:
@@ -30,11 +40,16 @@ class SubscriptionMiddleware(BaseMiddleware):
         self.admin_id = admin_id
 
     async def _is_subscribed(self, bot: Bot, user_id: int) -> bool:
+        cached = MEMBERS.get(user_id)
+        if cached is not None:
+            return cached
         try:
             member = await bot.get_chat_member(chat_id=self.channel_id, user_id=user_id)
-            return getattr(member, "status", None) in ALLOWED_STATUSES
+            ok = getattr(member, "status", None) in ALLOWED_STATUSES
         except TelegramBadRequest:
-            return False
+            ok = False
+        remember_membership(user_id, ok)
+        return ok
 
     async def __call__(
         self,
@@ -1,12 +1,15 @@
+import hashlib
 import html
 import re
-from datetime import datetime, timezone
-from typing import Optional
+import sys
+from datetime import date, datetime, timezone
+from typing import Any, List, Optional, Set
 
 from .config import MSK
 
 NBSPS = {"\u00A0", "\u202F", "\u2007"}
 HYPHENS = "-\u2010\u2011\u2012\u2013\u2014\u2212"
+HASH_VERSION = "v2:"  # хэши по строкам листа; старые (по тексту CSV) без префикса
 
 
 def norm(s: str) -> str:
@@ -45,5 +48,49 @@ def fmt_msk(iso: Optional[str]) -> str:
         return str(iso)
 
 
+def label_date(label: str, today: Optional[date] = None) -> Optional[date]:
+    """'08.09' -> дата; год не указан, берём ближайший к today."""
+    m = re.fullmatch(r"(\d{1,2})\.(\d{1,2})", (label or "").strip())
+    if not m:
+        return None
+    today = today or datetime.now(MSK).date()
+    days: List[date] = []
+    for y in (today.year - 1, today.year, today.year + 1):
+        try:
+            days.append(date(y, int(m.group(2)), int(m.group(1))))
+        except ValueError:
+            pass
+    return min(days, key=lambda d: abs((d - today).days), default=None)
+
+
 def bold(s: str) -> str:
     return f"<b>{html.escape(s)}</b>"
+
+
+def rows_hash(rows: List[List[str]]) -> str:
+    """Хэш содержимого листа, одинаковый для CSV- и xlsx-выгрузки (хвостовые пустые ячейки не важны)."""
+    trimmed = [r[:len(r) - next((i for i, c in enumerate(reversed(r)) if c), len(r))] for r in rows]
+    while trimmed and not trimmed[-1]:
+        trimmed.pop()
+    h = hashlib.sha256()
+    for r in trimmed:
+        h.update(("\x1f".join(r) + "\x1e").encode("utf-8"))
+    return HASH_VERSION + h.hexdigest()
+
+
+def deep_sizeof(obj: Any, seen: Optional[Set[int]] = None) -> int:
+    """Примерный размер объекта со всем содержимым, байт (общие объекты считаются один раз)."""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(x, seen) for x in obj)
+    elif hasattr(obj, "__dict__"):
+        size += deep_sizeof(vars(obj), seen)
+    if hasattr(type(obj), "__slots__"):
+        size += sum(deep_sizeof(getattr(obj, a), seen) for a in type(obj).__slots__ if hasattr(obj, a))
+    return size
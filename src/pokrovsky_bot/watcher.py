@@ -1,86 +1,348 @@
-import hashlib
+import html
 import random
 import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
 from aiogram import Bot
 
-from .db import sched_get_all, sched_upsert, hash_get, hash_set
-from .sheets import resolve_google_url, sheets_meta, csv_url
+from .ensure import forget_date, remember_sheet, track_served
+from .parser import class_hashes, compile_sheet, drop_rendered, grade_from_label
+from .config import MSK, settings
+from .db import (
+    sched_get_all, sched_get_active, sched_archive, sched_upsert, hash_get, hash_set,
+    sched_poll_info, sched_set_next_check, class_hashes_get, class_hashes_set, user_labels_for, now_utc,
+    http_cache_drop,
+)
+from .http import CACHE_STATS
+from .outbox import broadcast
+from .sheets import resolve_google_url, sheets_meta, invalidate, get_workbook, get_rows_from_csv, doc_prefix
 from .site import get_links_from_site
-from .http import fetch_text
-from .utils import fmt_msk
+from .utils import fmt_msk, label_date, rows_hash, HASH_VERSION
 from . import state
 
+# последний цикл: сколько дат опрошено, сколько ушло в архив, сколько HTTP-запросов, когда закончился и за сколько секунд
+WATCH_STATS = {"dates": 0, "archived": 0, "requests": 0, "at": None, "seconds": 0.0}
+TICK = 30  # как часто наблюдатель просыпается посмотреть, не пора ли что-то опросить, сек.
+EVENING_HOUR, MORNING_HOUR = 15, 10  # «горячо»: накануне с 15:00 и в сам день до 10:00 (MSK)
+FRESH_HOURS = 3  # только что опубликованную таблицу обычно сразу же и правят
 
-async def broadcast(bot: Bot, text: str):
-    from .db import DB
-    users = [row[0] for row in DB.execute("SELECT user_id FROM users").fetchall()]
-    sem = asyncio.Semaphore(20)
 
-    async def send(uid):
-        async with sem:
+def _label_key(label: str):
+    return grade_from_label(label) or 0, label
+
+
+def _date_key(date: str):
+    return label_date(date) or datetime.min.date(), date
+
+
+# ещё не разосланное: новые даты (-> когда найдены), правки листов без отпечатков классов, правки по классам
+DIGEST = {"new": {}, "tabs": {}, "classes": {}, "first": None, "last": None}
+PREWARM_TIMEOUT = 600  # новая дата так и не разобралась — всё равно анонсируем, сек.
+ANNOUNCED: Dict[str, str] = {}  # дата -> когда разослан анонс (для статистики прогрева)
+POLLED: Dict[str, Set[str]] = {}  # дата -> вкладки, скачанные в последнем опросе
+
+
+def _warm(date: str) -> bool:
+    """Все скачанные вкладки даты уже разобраны в MATRIX."""
+    return bool(POLLED.get(date)) and all((date, gid) in state.MATRIX for gid in POLLED[date])
+
+
+async def _collect(event: Tuple[str, str, Any]):
+    kind, date, what = event
+    if kind == "new":
+        DIGEST["new"].setdefault(date, time.monotonic())
+    elif kind == "tab":
+        DIGEST["tabs"].setdefault(date, set()).add(what)
+    else:
+        DIGEST["classes"].setdefault(date, set()).update(what)
+    now = time.monotonic()
+    DIGEST["first"] = DIGEST["first"] or now
+    DIGEST["last"] = now
+
+
+def flush_digest() -> int:
+    """Рассылает накопленное: каждому получателю одно сообщение сразу обо всём, что его касается.
+
+    Ждёт WATCH_DIGEST_DELAY сек. без новых правок (но не дольше трёх окон с первой), возвращает число рассылок.
+    Новую дату анонсирует, только когда все её листы уже разобраны в MATRIX (или прошло PREWARM_TIMEOUT),
+    и волнами ANNOUNCE_WAVE_SIZE получателей раз в ANNOUNCE_WAVE_INTERVAL сек., чтобы нажатия не пришли разом.
+    """
+    if DIGEST["last"] is None:
+        return 0
+    now, delay = time.monotonic(), settings.WATCH_DIGEST_DELAY
+    if now - DIGEST["last"] < delay and now - DIGEST["first"] < 3 * delay:
+        return 0
+    new = {d for d, t in DIGEST["new"].items() if _warm(d) or now - t >= PREWARM_TIMEOUT}
+    waiting = {d: t for d, t in DIGEST["new"].items() if d not in new}
+    tabs, classes = DIGEST["tabs"], DIGEST["classes"]
+    if not (new or tabs or classes):
+        return 0
+    DIGEST.update(new=waiting, tabs={}, classes={}, first=now if waiting else None, last=now if waiting else None)
+    waves = {"wave_size": settings.ANNOUNCE_WAVE_SIZE, "wave_interval": settings.ANNOUNCE_WAVE_INTERVAL} if new else {}
+    for d in new:
+        ANNOUNCED[d] = now_utc()
+        track_served(d)
+
+    common = [f"🆕 Появилось новое расписание на <b>{d}</b>" for d in sorted(new, key=_date_key)]
+    common += [f"✏️ Обновлено расписание на <b>{d}</b> — внесены правки в лист «{html.escape(t)}»"
+               for d in sorted(tabs, key=_date_key) for t in sorted(tabs[d])]
+    # кому какие классы: получатели с одинаковым набором (дата, класс) получают один общий текст
+    per_user: Dict[int, set] = {}
+    for d, labels in classes.items():
+        for uid, mine in user_labels_for(labels).items():
+            per_user.setdefault(uid, set()).update((d, lb) for lb in mine)
+    groups: Dict[frozenset, List[int]] = {}
+    for uid, pairs in per_user.items():
+        groups.setdefault(frozenset(pairs), []).append(uid)
+
+    tnow = fmt_msk(now_utc())
+    for pairs, users in groups.items():
+        by_date: Dict[str, List[str]] = {}
+        for d, lb in pairs:
+            by_date.setdefault(d, []).append(lb)
+        lines = common + [
+            f"✏️ Обновлено расписание на <b>{d}</b> — изменения у классов: <b>{html.escape(', '.join(sorted(lbs, key=_label_key)))}</b>"
+            for d, lbs in sorted(by_date.items(), key=lambda x: _date_key(x[0]))
+        ]
+        broadcast("\n".join(lines + [tnow]), users, **waves)
+    if common:
+        broadcast("\n".join(common + [tnow]), exclude=per_user.keys(), **waves)
+    return len(groups) + bool(common)
+
+
+def active_schedules() -> Dict[str, Tuple[str, Optional[str]]]:
+    """Даты, которые ещё стоит опрашивать; прошедшие (старше WATCH_ACTIVE_DAYS дней) уходят в архив."""
+    today = datetime.now(MSK).date()
+    active, past = {}, []
+    known = sched_get_active()
+    for date, v in known.items():
+        d = label_date(date, today)
+        if d is not None and (today - d).days > settings.WATCH_ACTIVE_DAYS:
+            past.append(date)
+        else:
+            active[date] = v
+    # разобранные листы держим только для дат в работе: архивную дату, открытую из старой кнопки,
+    # хэндлеры загрузят снова, но в памяти она живёт не дольше цикла
+    for date in ({k[0] for k in state.MATRIX} | state.GID_BY_GRADE.keys() | POLLED.keys()) - active.keys():
+        forget_date(date)
+        POLLED.pop(date, None)
+        drop_rendered(date)
+    if past:
+        sched_archive(past)
+        # ответы архивных дат больше не перепроверяются — из HTTP-кэша их тоже убираем
+        in_use = {g for _l, g in active.values() if g}
+        http_cache_drop([known[d][0] for d in past],
+                        [doc_prefix(known[d][1]) for d in past if known[d][1] and known[d][1] not in in_use])
+    WATCH_STATS["archived"] = len(past)
+    return active
+
+
+def poll_interval(date: str, created_at: Optional[str], changed_at: Optional[str], now: datetime) -> float:
+    """Через сколько секунд снова опрашивать таблицу даты.
+
+    Горячо (опубликована меньше FRESH_HOURS назад, вечер накануне, утро самого дня) — WATCH_HOT_INTERVAL.
+    Иначе WATCH_MIN_INTERVAL, удваивающийся за каждые WATCH_BACKOFF_HOURS без правок, но не больше WATCH_MAX_INTERVAL.
+    """
+    local = now.astimezone(MSK)
+    day = label_date(date, local.date())
+    if day is not None and (
+        (day == local.date() + timedelta(days=1) and local.hour >= EVENING_HOUR)
+        or (day == local.date() and local.hour < MORNING_HOUR)
+    ):
+        return settings.WATCH_HOT_INTERVAL
+    if created_at and now - datetime.fromisoformat(created_at) < timedelta(hours=FRESH_HOURS):
+        return settings.WATCH_HOT_INTERVAL
+    last = max(filter(None, (created_at, changed_at)), default=None)
+    quiet_h = max((now - datetime.fromisoformat(last)).total_seconds() / 3600, 0.0) if last else 0.0
+    return min(settings.WATCH_MIN_INTERVAL * 2 ** (quiet_h / settings.WATCH_BACKOFF_HOURS), settings.WATCH_MAX_INTERVAL)
+
+
+def plan_next_checks(dates: Iterable[str]):
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    info = sched_poll_info()
+    for date in dates:
+        if date in info:
+            created_at, changed_at, _ = info[date]
+            delay = poll_interval(date, created_at, changed_at, now) * random.uniform(0.9, 1.1)
+            sched_set_next_check(date, (now + timedelta(seconds=int(delay))).isoformat())
+
+
+def due_dates(active: Dict[str, Tuple[str, Optional[str]]]) -> Dict[str, Tuple[str, Optional[str]]]:
+    info, now = sched_poll_info(), now_utc()
+    return {d: v for d, v in active.items() if not (info.get(d) and info[d][2] and info[d][2] > now)}
+
+
+_DONE = object()  # конец потока элементов для стадии
+QUEUE_SIZE = 16
+
+
+async def _stage(
+    inbox: asyncio.Queue,
+    outbox: Optional[asyncio.Queue],
+    workers: int,
+    handle: Callable[[Any], Awaitable[Optional[Iterable[Any]]]],
+):
+    """workers обработчиков берут элементы из inbox, результаты handle кладут в outbox.
+
+    Ошибка на одном элементе (дата, вкладка) не останавливает стадию. Когда приходит _DONE
+    и все обработчики закончили, _DONE уходит дальше — следующая стадия тоже завершается.
+    """
+    async def worker():
+        while True:
+            item = await inbox.get()
+            if item is _DONE:
+                inbox.put_nowait(_DONE)  # разбудить остальных обработчиков стадии
+                return
             try:
-                await bot.send_message(uid, text, disable_notification=True)
+                out = await handle(item)
             except Exception:
-                pass
+                continue
+            if outbox is not None:
+                for x in out or ():
+                    await outbox.put(x)
+
+    await asyncio.gather(*(worker() for _ in range(max(1, workers))))
+    if outbox is not None:
+        await outbox.put(_DONE)
 
-    await asyncio.gather(*(send(uid) for uid in users))
 
+async def _resolve(item) -> List[tuple]:
+    date, (link_url, g_url) = item
+    if not g_url:
+        g_url = await resolve_google_url(link_url, fresh=True)
+        sched_upsert(date, link_url, g_url)
+    state.DOC_URL[date] = g_url
+    gid2title, gids = await sheets_meta(g_url, fresh=True)  # заодно обновляет кэш для хэндлеров
+    return [(date, g_url, gid2title, gids)]
 
-async def check_once(bot: Bot):
+
+async def _fetch(item) -> List[tuple]:
+    date, g_url, gid2title, gids = item
     try:
-        links = await get_links_from_site()
+        book = await get_workbook(g_url, gid2title)  # один запрос на всю таблицу
     except Exception:
-        return
+        book = {}
+    tabs = list(gid2title.keys() or gids)
+    missing = [gid for gid in tabs if gid not in book]
+    # чего нет в xlsx — по CSV, все вкладки параллельно
+    fetched = await asyncio.gather(*(get_rows_from_csv(g_url, gid) for gid in missing), return_exceptions=True)
+    book = {**book, **{gid: rows for gid, rows in zip(missing, fetched) if not isinstance(rows, BaseException)}}
+    POLLED[date] = {gid for gid in tabs if gid in book}
+    return [(date, gid, gid2title.get(gid, ""), book[gid]) for gid in tabs if gid in book]
 
-    known = sched_get_all()
 
+async def _compare(item) -> List[Tuple[str, str, Any]]:
+    """Сверка с прошлой версией вкладки: события для сводки ("tab" / "classes", дата, что изменилось)."""
+    date, gid, title, rows = item
+    h = rows_hash(rows)
+    old = hash_get(date, gid)
+    prev_hashes = class_hashes_get(date, gid)
+    fingerprinted = prev_hashes is not None
+    cached = state.MATRIX.get((date, gid))
+    warm = cached is not None and cached.digest == h
+    if old == h and fingerprinted and warm:
+        return []
+    if old != h:
+        hash_set(date, gid, title, h, changed=bool(old and old.startswith(HASH_VERSION)))
+    if not warm:
+        # в тот же кэш, что и у хэндлеров: после правки (и после перезапуска) нажатия не ходят в Google;
+        # заново разбираем только изменившиеся полосы классов
+        remember_sheet(date, gid, compile_sheet(rows, cached))
+    sheet = state.MATRIX[(date, gid)]
+    if old == h and fingerprinted:
+        return []
+    new_hashes = class_hashes(sheet)
+    class_hashes_set(date, gid, new_hashes)
+    if old is None or old == h or not old.startswith(HASH_VERSION):
+        return []  # первый раз видим лист (или только заводим отпечатки классов) — сообщать не о чем
+    drop_rendered(date, gid)
+    if not fingerprinted:
+        # отпечатков по классам ещё нет — не знаем, кого касается правка (вкладка без классов — никого)
+        return [("tab", date, title or f"лист {gid}")] if new_hashes else []
+    changed = sorted(
+        {lb for lb in new_hashes.keys() | prev_hashes.keys() if new_hashes.get(lb) != prev_hashes.get(lb)},
+        key=_label_key,
+    )
+    if not changed:
+        return []  # правка не задела уроки ни одного класса
+    return [("classes", date, changed)]
+
+
+async def discover_links(links) -> List[Tuple[str, str, Any]]:
+    """Новые даты и сменившиеся ссылки со страницы школы; возвращает события ("new", дата, None) для сводки."""
+    known = sched_get_all()
+    announce = []
     for l in links:
+        if l.date in known and known[l.date][0] != l.url:
+            # ссылка на дату поменялась — старое соответствие странице больше не годится
+            invalidate(page_url=known[l.date][0])
+            sched_upsert(l.date, l.url, None)
+            state.DOC_URL.pop(l.date, None)
         if l.date not in known:
             try:
-                g_url = await resolve_google_url(l.url)
+                g_url = await resolve_google_url(l.url, fresh=True)
             except Exception:
                 g_url = None
             sched_upsert(l.date, l.url, g_url)
-            await broadcast(bot, f"🆕 Появилось новое расписание на <b>{l.date}</b>")
+            announce.append(("new", l.date, None))
             state.DOC_URL[l.date] = g_url or state.DOC_URL.get(l.date)
+    return announce
 
-    for date, (link_url, g_url) in sched_get_all().items():
-        if not g_url:
-            try:
-                g_url = await resolve_google_url(link_url)
-                sched_upsert(date, link_url, g_url)
-            except Exception:
-                continue
+
+async def check_once(bot: Bot, discover: bool = True):
+    """Один цикл наблюдателя конвейером: ссылки и вкладки → загрузка → сверка → события в сводку (DIGEST).
+
+    discover — заодно проверить страницу школы. Опрашиваются только даты, чей next_check наступил.
+    Стадии работают одновременно и связаны ограниченными очередями, так что медленная вкладка
+    или долгая рассылка не держат опрос остальных.
+    """
+    started, requests_before = time.monotonic(), CACHE_STATS["requests"]
+    announce, links = [], None
+    if discover:
         try:
-            gid2title, gids = await sheets_meta(g_url)
+            links = await get_links_from_site()
         except Exception:
-            continue
+            return
+        announce = await discover_links(links)
 
-        for gid in (gid2title.keys() or gids):
-            try:
-                csv_text = await fetch_text(csv_url(g_url, gid))
-            except Exception:
-                continue
+    due = due_dates(active_schedules())
+    if not due and not announce and not discover:
+        return
+
+    resolve_q, fetch_q, compare_q, notify_q = (asyncio.Queue(QUEUE_SIZE) for _ in range(4))
+
+    async def feed():
+        for item in announce:
+            await notify_q.put(item)
+        for item in due.items():
+            await resolve_q.put(item)
+        await resolve_q.put(_DONE)
 
-            h = hashlib.sha256(csv_text.encode("utf-8")).hexdigest()
-            old = hash_get(date, gid)
-            if old is None:
-                hash_set(date, gid, gid2title.get(gid, ""), h)
-            elif old != h:
-                hash_set(date, gid, gid2title.get(gid, ""), h)
-                tnow = fmt_msk(None)
-                title = gid2title.get(gid, f"лист {gid}")
-                await broadcast(
-                    bot,
-                    f"✏️ Обновлено расписание на <b>{date}</b> — внесены правки в лист «{title}»\n{tnow}"
-                )
+    await asyncio.gather(
+        feed(),
+        _stage(resolve_q, fetch_q, settings.WATCH_RESOLVE_WORKERS, _resolve),
+        _stage(fetch_q, compare_q, settings.WATCH_FETCH_WORKERS, _fetch),
+        _stage(compare_q, notify_q, 1, _compare),  # SQLite и MATRIX — по одной вкладке за раз
+        _stage(notify_q, None, 1, _collect),
+    )
+    plan_next_checks(due)
 
-    state.LINKS.clear()
-    state.LINKS.extend(links or [])
+    if links is not None:
+        state.LINKS.clear()
+        state.LINKS.extend(links)
+    # при параллельных запросах хэндлеров счётчик захватывает и их — для оценки этого достаточно
+    WATCH_STATS.update(dates=len(due), requests=CACHE_STATS["requests"] - requests_before, at=now_utc(),
+                       seconds=round(time.monotonic() - started, 1))
 
 
 async def watch_loop(bot: Bot):
-    await check_once(bot)
+    """Просыпается каждые TICK секунд: страница школы — раз в WATCH_SITE_INTERVAL, таблицы — по своему расписанию."""
+    last_site = None
     while True:
-        await asyncio.sleep(random.randint(300, 600))
-        await check_once(bot)
+        discover = last_site is None or time.monotonic() - last_site >= settings.WATCH_SITE_INTERVAL
+        if discover:
+            last_site = time.monotonic()
+        await check_once(bot, discover)
+        flush_digest()
+        await asyncio.sleep(TICK)
@@ -0,0 +1,228 @@
+import re
+import zipfile
+from datetime import datetime, timedelta
+from io import BytesIO
+from posixpath import join, normpath
+from typing import Dict, List, Optional, Tuple
+from xml.etree.ElementTree import iterparse, fromstring
+
+NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+PKG_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+# встроенные форматы Excel (в styles.xml их кодов нет); краткая дата 14 — как в CSV таблицы с русской локалью
+BUILTIN_FMTS = {
+    1: "0", 2: "0.00", 3: "#,##0", 4: "#,##0.00", 9: "0%", 10: "0.00%",
+    14: "dd.mm.yyyy", 15: "d-mmm-yy", 16: "d-mmm", 17: "mmm-yy", 18: "h:mm AM/PM", 19: "h:mm:ss AM/PM",
+    20: "h:mm", 21: "h:mm:ss", 22: "dd.mm.yyyy h:mm", 45: "mm:ss", 46: "[h]:mm:ss", 47: "mm:ss.0",
+}
+COL_RX = re.compile(r"([A-Z]+)(\d*)")
+FMT_TOKEN_RX = re.compile(
+    r'"[^"]*"|\\.|_.|\*.|\[[^\]]*\]|am/pm|a/p|y+|m+|d+|h+|s+|\.0+|[0#?,.]+|.', re.I)
+EPOCH = datetime(1899, 12, 30)
+MONTHS = ["January", "February", "March", "April", "May", "June", "July", "August", "September", "October",
+          "November", "December"]
+# локаль таблицы -> (десятичный разделитель, разделитель разрядов): в xlsx её нет, а CSV-выгрузка пишет числа по ней
+SEPARATORS = {"ru": (",", "\u00a0"), "en": (".", ",")}
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+
+def _col_index(ref: str) -> int:
+    letters = COL_RX.match(ref).group(1)
+    n = 0
+    for ch in letters:
+        n = n * 26 + (ord(ch) - 64)
+    return n - 1
+
+
+def _shared_strings(zf: zipfile.ZipFile) -> List[str]:
+    if "xl/sharedStrings.xml" not in zf.namelist():
+        return []
+    out: List[str] = []
+    with zf.open("xl/sharedStrings.xml") as f:
+        for _ev, el in iterparse(f):
+            if el.tag == f"{NS}si":
+                # текст либо прямо в <t>, либо в форматированных кусках <r><t>; фонетику (rPh) пропускаем
+                out.append((el.findtext(f"{NS}t") or "") + "".join(r.findtext(f"{NS}t") or "" for r in el.findall(f"{NS}r")))
+                el.clear()
+    return out
+
+
+def _num_formats(zf: zipfile.ZipFile) -> List[Optional[str]]:
+    """Для каждого индекса стиля ячейки: код числового формата (None — «Общий»)."""
+    if "xl/styles.xml" not in zf.namelist():
+        return []
+    root = fromstring(zf.read("xl/styles.xml"))
+    codes = dict(BUILTIN_FMTS)
+    for nf in root.iter(f"{NS}numFmt"):
+        codes[int(nf.get("numFmtId", "0"))] = nf.get("formatCode", "")
+    xfs = root.find(f"{NS}cellXfs")
+    return [codes.get(int(xf.get("numFmtId", "0"))) for xf in (xfs if xfs is not None else [])]
+
+
+def _section(code: str, x: float):
+    """Секция формата «положительные;отрицательные;ноль» для x и знак, который надо дописать самим."""
+    parts = re.findall(r'(?:"[^"]*"|\\.|[^;])+', code) or [""]
+    if x < 0 and len(parts) > 1:
+        return parts[1], ""
+    if x == 0 and len(parts) > 2:
+        return parts[2], ""
+    return parts[0], "-" if x < 0 else ""
+
+
+def _date_part(t: str) -> bool:
+    return t[0].lower() in "ymdhs" or t[:2].lower() in ("[h", "[m", "[s")
+
+
+def _format_date(x: float, tokens: List[str], seps: Tuple[str, str]) -> str:
+    secs = round(x * 86400)
+    dt = EPOCH + timedelta(seconds=secs)
+    parts = [i for i, t in enumerate(tokens) if _date_part(t)]
+    ampm = any(t.lower() in ("am/pm", "a/p") for t in tokens)
+    out = []
+    for i, t in enumerate(tokens):
+        lo, n = t.lower(), len(t)
+        if t[0] == '"':
+            out.append(t[1:-1])
+        elif t[0] == "\\":
+            out.append(t[1])
+        elif lo in ("[h]", "[hh]"):
+            out.append(str(secs // 3600).zfill(n - 2))
+        elif lo in ("[m]", "[mm]"):
+            out.append(str(secs // 60).zfill(n - 2))
+        elif lo in ("[s]", "[ss]"):
+            out.append(str(secs).zfill(n - 2))
+        elif t[0] == "[":
+            continue  # цвет, локаль, условие
+        elif lo[0] == "y":
+            out.append(f"{dt.year:04d}" if n > 2 else f"{dt.year % 100:02d}")
+        elif lo[0] == "d":
+            out.append(str(dt.day).zfill(n) if n <= 2 else DAYS[dt.weekday()][:3 if n == 3 else None])
+        elif lo[0] == "m":
+            k = parts.index(i)
+            prev = tokens[parts[k - 1]].lower().lstrip("[") if k else ""
+            nxt = tokens[parts[k + 1]].lower() if k + 1 < len(parts) else ""
+            if n <= 2 and (prev[:1] == "h" or nxt[:1] == "s"):  # mm после часов или перед секундами — минуты
+                out.append(str(dt.minute).zfill(n))
+            else:
+                out.append(str(dt.month).zfill(n) if n <= 2 else MONTHS[dt.month - 1][:3 if n == 3 else None])
+        elif lo[0] == "h":
+            out.append(str((dt.hour % 12 or 12) if ampm else dt.hour).zfill(min(n, 2)))
+        elif lo[0] == "s":
+            out.append(str(dt.second).zfill(min(n, 2)))
+        elif lo == "am/pm":
+            out.append("AM" if dt.hour < 12 else "PM")
+        elif lo == "a/p":
+            out.append("A" if dt.hour < 12 else "P")
+        elif t.startswith(".0"):
+            out.append(seps[0] + "0" * (n - 1))  # доли секунды: после округления до секунд всегда нули
+        else:
+            out.append(t)
+    return "".join(out)
+
+
+def _format_number(x: float, tokens: List[str], sign: str, seps: Tuple[str, str]) -> str:
+    digits = "".join(t for t in tokens if t[0] in "0#?,." and t != ",")
+    if "%" in tokens:
+        x *= 100
+    whole, _, frac = digits.partition(".")
+    head, _, tail = f"{abs(x):.{len(frac)}f}".partition(".")
+    if "#" in frac:
+        # «#» в дробной части — необязательная цифра: хвостовые нули до обязательных «0» не пишутся
+        tail = tail.rstrip("0").ljust(frac.count("0"), "0")
+    head = head.lstrip("0").zfill(whole.count("0"))  # «00» — не меньше двух цифр, «#» — ни одной лишней
+    if "," in whole:
+        head = re.sub(r"\B(?=(\d{3})+$)", seps[1], head)
+    text = head + (seps[0] + tail if tail else "")
+    out, placed = [], False
+    for t in tokens:
+        if t[0] in "0#?,.":
+            if not placed:
+                out.append(sign + text)
+                placed = True
+        elif t[0] == '"':
+            out.append(t[1:-1])
+        elif t[0] == "\\":
+            out.append(t[1])
+        elif t[0] == "_":
+            out.append(" ")  # отступ шириной в символ
+        elif t[0] in "[*":
+            continue
+        else:
+            out.append(t)
+    return "".join(out)
+
+
+def _number(v: str, fmt: Optional[str], seps: Tuple[str, str] = SEPARATORS["ru"]) -> str:
+    """Число так, как его показывает таблица (и отдаёт CSV-выгрузка): по коду формата ячейки и локали."""
+    try:
+        x = float(v)
+    except ValueError:
+        return v
+    code, sign = _section(fmt or "", x)
+    if code and code != "@" and not re.search(r"general|e\+", code, re.I):
+        tokens = FMT_TOKEN_RX.findall(code)
+        if not any(_date_part(t) for t in tokens):
+            return _format_number(x, tokens, sign, seps)
+        if x >= 0:
+            return _format_date(x, tokens, seps)
+    return str(int(x)) if x.is_integer() else v.replace(".", seps[0])
+
+
+def _read_sheet(f, strings: List[str], formats: List[Optional[str]], seps: Tuple[str, str]) -> List[List[str]]:
+    rows: List[List[str]] = []
+    for _ev, el in iterparse(f):
+        if el.tag != f"{NS}row":
+            continue
+        r = int(el.get("r") or len(rows) + 1) - 1
+        while len(rows) < r:
+            rows.append([])
+        row: List[str] = []
+        for c in el.iter(f"{NS}c"):
+            j = _col_index(c.get("r")) if c.get("r") else len(row)
+            t = c.get("t", "n")
+            v = c.find(f"{NS}v")
+            if t == "inlineStr":
+                val = "".join(x.text or "" for x in c.iter(f"{NS}t"))
+            elif v is None or v.text is None:
+                val = ""
+            elif t == "s":
+                val = strings[int(v.text)]
+            elif t == "b":
+                val = "TRUE" if v.text == "1" else "FALSE"
+            elif t == "n":
+                s = int(c.get("s", "0"))
+                val = _number(v.text, formats[s] if s < len(formats) else None, seps)
+            else:
+                val = v.text
+            if j >= len(row):
+                row.extend([""] * (j - len(row) + 1))
+            row[j] = val
+        rows.append(row)
+        el.clear()
+    while rows and not any(rows[-1]):
+        rows.pop()
+    width = max((len(r) for r in rows), default=0)
+    for row in rows:
+        row.extend([""] * (width - len(row)))
+    return rows
+
+
+def read_workbook(data: bytes, locale: str = "ru") -> Dict[str, List[List[str]]]:
+    """Все листы xlsx-книги за один проход: {название листа: строки как в CSV-выгрузке таблицы с локалью locale}."""
+    seps = SEPARATORS.get(locale, SEPARATORS["en"])
+    with zipfile.ZipFile(BytesIO(data)) as zf:
+        rels = {
+            r.get("Id"): r.get("Target")
+            for r in fromstring(zf.read("xl/_rels/workbook.xml.rels")).iter(f"{PKG_REL_NS}Relationship")
+        }
+        strings = _shared_strings(zf)
+        formats = _num_formats(zf)
+        out: Dict[str, List[List[str]]] = {}
+        for sh in fromstring(zf.read("xl/workbook.xml")).iter(f"{NS}sheet"):
+            target: Optional[str] = rels.get(sh.get(f"{REL_NS}id"))
+            if not target:
+                continue
+            path = target.lstrip("/") if target.startswith("/") else normpath(join("xl", target))
+            with zf.open(path) as f:
+                out[sh.get("name", "")] = _read_sheet(f, strings, formats, seps)
+    return out